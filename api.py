@@ -1,19 +1,43 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.encoders import jsonable_encoder
 from contextlib import asynccontextmanager
+import asyncio
 import uuid
 import httpx
 import json
 
-from dto import QueryRequest, QueryResponse
-from chat_service import get_response
-from utils import hash_password
-from config import PRODUCT_TYPE, PRODUCTS_MODULE_URL
+from dto import QueryRequest, QueryResponse, BatchRequest
+from chat_service import get_response, stream_response
+from utils import hash_password, audit_log
+from products_client import ProductsClient, ProductsUnavailable
+from services import resolve_products, warmup
+from startup import Startup
+from timing import stage, start_timing, server_timing
+from yandex_gpt import bootstrap
+from indexer import normalize_query
+from config import (
+    PRODUCT_TYPE,
+    BATCH_MAX_SIZE,
+    BATCH_CONCURRENCY,
+    PRODUCTS_MODULE_URL,
+    PRODUCTS_ENGINE,
+    PRODUCTS_HTTP2,
+    PRODUCTS_MAX_CONNECTIONS,
+    PRODUCTS_MAX_KEEPALIVE,
+    PRODUCTS_TIMEOUT,
+    PRODUCTS_CONNECT_TIMEOUT,
+    PRODUCTS_POOL_TIMEOUT,
+    PRODUCTS_RETRIES,
+    PRODUCTS_BACKOFF,
+    PRODUCTS_BREAKER_THRESHOLD,
+    PRODUCTS_BREAKER_RESET,
+)
 from repository import (
     init,
-    get_user_by_token_id,
-    get_thread_by_user,
+    run_db,
+    cached_session,
+    get_session,
     add_new_user,
     add_token,
     get_user_by_INN,
@@ -36,12 +60,41 @@ from validators import (
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init()
+    # фазы идут параллельно; запросы принимаются после базы, /ready — после всех
+    app.state.startup = Startup({"db": init, "llm": bootstrap, "index": warmup})
+    app.state.startup.start()
+    await app.state.startup.wait("db")
+    audit_log.start()
+    app.state.products = None
+    if PRODUCTS_ENGINE == "remote":
+        app.state.products = ProductsClient(
+            PRODUCTS_MODULE_URL,
+            http2=PRODUCTS_HTTP2,
+            max_connections=PRODUCTS_MAX_CONNECTIONS,
+            max_keepalive=PRODUCTS_MAX_KEEPALIVE,
+            timeout=PRODUCTS_TIMEOUT,
+            connect_timeout=PRODUCTS_CONNECT_TIMEOUT,
+            pool_timeout=PRODUCTS_POOL_TIMEOUT,
+            retries=PRODUCTS_RETRIES,
+            backoff=PRODUCTS_BACKOFF,
+            breaker_threshold=PRODUCTS_BREAKER_THRESHOLD,
+            breaker_reset=PRODUCTS_BREAKER_RESET,
+        )
     yield
+    await app.state.startup.stop()
+    if app.state.products is not None:
+        await app.state.products.aclose()
+    await audit_log.stop()
 
 app = FastAPI(lifespan=lifespan)
 
 
+@app.get("/ready")
+async def ready(request: Request):
+    report = request.app.state.startup.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.post("/login")
 async def login(request: Request):
     payload = await request.json()
@@ -57,66 +110,177 @@ async def login(request: Request):
 
     password_hash = hash_password(password)
 
-    user = get_user_by_INN(inn)
+    user = await run_db(get_user_by_INN, inn)
     if user:
         user_id = user.get("id")
         stored_hash = user.get("password_hash")
         if stored_hash != password_hash:
             raise HTTPException(status_code=401, detail="Invalid credentials.")
         
-        token = get_token_by_user(user_id)
+        token = await run_db(get_token_by_user, user_id)
         if not token:
             new_token = uuid.uuid4().hex
-            add_token(user_id, new_token)
+            await run_db(add_token, user_id, new_token)
             return {"token": new_token}
         return {"token": token}
     else:
-        user_id = add_new_user(
-            fullname=fullname, INN=inn, phone=phone, password_hash=password_hash
-        )
+        user_id = await run_db(add_new_user, fullname, inn, phone, password_hash)
         new_token = uuid.uuid4().hex
-        add_token(user_id, new_token)
+        await run_db(add_token, user_id, new_token)
         return {"token": new_token}
 
 
-@app.post("/chat")
-async def chat(req: QueryRequest, request: Request):
-    request_id = uuid.uuid4().hex
+async def authenticate(request: Request) -> tuple[str, int]:
     token = request.headers.get("token")
-    origin = request.headers.get("origin", "")
-
     if not token:
         raise HTTPException(status_code=401, detail="Token header is missing.")
 
-    user_id = get_user_by_token_id(token)
+    user_id = cached_session(token) or await run_db(get_session, token)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
-    thread_id = get_thread_by_user(user_id)
+    return token, user_id
+
+
+async def answer(request: Request, response: dict, text: str, token: str, origin: str) -> QueryResponse:
+    if response.get("category") == PRODUCT_TYPE and PRODUCTS_ENGINE == "local":
+        result_text, options = await resolve_products(response, text)
+        return QueryResponse(result_text=result_text, options=options)
+    if response.get("category") == PRODUCT_TYPE:
+        external_resp = await request.app.state.products.fetch({
+            "source": origin,
+            "token": token,
+            "payload": response
+        })
+
+        if external_resp.status_code == 200:
+            data = external_resp.json()
+            result_text = data.get("result_text")
+            options = data.get("options", [])
+            return QueryResponse(result_text=result_text, options=options)
+        else:
+            return QueryResponse(result_text=external_resp.text, options=[])
+
+    return QueryResponse(result_text=response, options=[])
 
-    try:
-        response = await get_response(request_id, user_id, thread_id, req.text, token, origin)
-        if getattr(response, "category", None) == PRODUCT_TYPE:
-            async with httpx.AsyncClient() as client:
-                external_resp = await client.get(
-                    PRODUCTS_MODULE_URL,
-                    json={
-                        "source": origin,
-                        "token": token,
-                        "payload": response
-                    }
-                )
 
-            if external_resp.status_code == 200:
-                data = external_resp.json()
-                result_text = data.get("result_text")
-                options = data.get("options", [])
-                return QueryResponse(result_text=result_text, options=options)
-            else:
-                return QueryResponse(result_text=external_resp.error)
+def sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
 
-        return QueryResponse(result_text=response, options=[])
 
+@app.post("/chat")
+async def chat(req: QueryRequest, request: Request, http_response: Response):
+    request_id = uuid.uuid4().hex
+    origin = request.headers.get("origin", "")
+    stages = start_timing()
+    with stage("auth"):
+        token, user_id = await authenticate(request)
+
+    try:
+        response = await get_response(request_id, user_id, req.text, token, origin)
+        with stage("products"):
+            result = await answer(request, response, req.text, token, origin)
+        http_response.headers["Server-Timing"] = server_timing(stages)
+        return result
+
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Language model timed out.")
+    except (ProductsUnavailable, httpx.TransportError):
+        raise HTTPException(status_code=503, detail="Products module is unavailable.")
     except Exception as e:
         print(e)
-        return HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: QueryRequest, request: Request):
+    """Тот же ответ, что и /chat, но этапами через server-sent events:
+    accepted, token, category, analysis, products (для товарных запросов), final."""
+    request_id = uuid.uuid4().hex
+    origin = request.headers.get("origin", "")
+    token, user_id = await authenticate(request)
+
+    async def events():
+        yield sse("accepted", {"request_id": request_id})
+        try:
+            response = None
+            async for event, data in stream_response(
+                request_id, user_id, req.text, token, origin, stream_tokens=True
+            ):
+                if event == "analysis":
+                    response = data
+                yield sse(event, data)
+
+            result = await answer(request, response, req.text, token, origin)
+            if response.get("category") == PRODUCT_TYPE:
+                yield sse("products", result)
+            yield sse("final", result)
+
+        except asyncio.TimeoutError:
+            yield sse("error", {"status_code": 504, "detail": "Language model timed out."})
+        except (ProductsUnavailable, httpx.TransportError):
+            yield sse("error", {"status_code": 503, "detail": "Products module is unavailable."})
+        except Exception as e:
+            print(e)
+            yield sse("error", {"status_code": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch(req: BatchRequest, request: Request):
+    """Разбор многих текстов под одним токеном. Одинаковые тексты разбираются
+    один раз, без истории диалога и не попадая в нее. Ответ —
+    {"results": [...]} в порядке texts или, при stream=true, ndjson-строки
+    {"index": ..., ...} по мере готовности."""
+    origin = request.headers.get("origin", "")
+    token, user_id = await authenticate(request)
+    if len(req.texts) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {BATCH_MAX_SIZE} texts.")
+
+    unique = {}
+    for i, text in enumerate(req.texts):
+        unique.setdefault(normalize_query(text), []).append(i)
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(indices: list[int]) -> tuple[list[int], dict]:
+        text = req.texts[indices[0]]
+        async with semaphore:
+            try:
+                response = await get_response(
+                    uuid.uuid4().hex, user_id, text, token, origin, keep_history=False
+                )
+                result = (await answer(request, response, text, token, origin)).model_dump()
+            except asyncio.TimeoutError:
+                result = {"error": "Language model timed out."}
+            except (ProductsUnavailable, httpx.TransportError):
+                result = {"error": "Products module is unavailable."}
+            except Exception as e:
+                print(e)
+                result = {"error": str(e)}
+        return indices, result
+
+    tasks = [asyncio.create_task(run(indices)) for indices in unique.values()]
+
+    if not req.stream:
+        results = [None] * len(req.texts)
+        for indices, result in await asyncio.gather(*tasks):
+            for i in indices:
+                results[i] = result
+        return {"results": results}
+
+    async def lines():
+        try:
+            for task in asyncio.as_completed(tasks):
+                indices, result = await task
+                for i in indices:
+                    yield json.dumps({"index": i, **jsonable_encoder(result)}, ensure_ascii=False) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,78 @@
+import re
+import json
+from bisect import bisect_left
+from pathlib import Path
+
+ARTICLE_REGEX = re.compile(r"(?<![\w-])\d{2}[-‐‑–—]\d{4}(?:[-‐‑–—][0-9A-Za-zА-Яа-я]{1,3})*(?![\w-])")
+BARCODE_REGEX = re.compile(r"(?<!\d)\d{8,14}(?!\d)")
+PRODUCTID_REGEX = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+FIELDS = ('article', 'barcode', 'productid')
+DASHES = str.maketrans({'‐': '-', '‑': '-', '–': '-', '—': '-'})
+# кириллица, которую пишут вместо латиницы в суффиксах артикулов (06-0111-А)
+LOOKALIKES = str.maketrans('АВЕКМНОРСТХ', 'ABEKMHOPCTX')
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper().translate(DASHES).translate(LOOKALIKES)
+
+
+class ArticleIndex:
+    """Точный и префиксный поиск товара по артикулу, штрихкоду и productid."""
+
+    def __init__(self, keys: dict[str, dict[str, list[int]]] | None = None):
+        self.keys = keys or {field: {} for field in FIELDS}
+        self._sorted_articles = sorted(self.keys['article'])
+
+    @classmethod
+    def build(cls, records: list[dict], ids: list[int]) -> "ArticleIndex":
+        keys = {field: {} for field in FIELDS}
+        for record, product_id in zip(records, ids):
+            for field in FIELDS:
+                value = record.get(field)
+                if value:
+                    keys[field].setdefault(normalize_code(str(value)), []).append(product_id)
+        return cls(keys)
+
+    @classmethod
+    def load(cls, path: Path) -> "ArticleIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.keys, f, ensure_ascii=False)
+
+    def get(self, field: str, code: str) -> list[int]:
+        return self.keys[field].get(normalize_code(code), [])
+
+    def prefix(self, code: str, limit: int = 20) -> list[int]:
+        code = normalize_code(code)
+        found = []
+        start = bisect_left(self._sorted_articles, code)
+        for key in self._sorted_articles[start:]:
+            if not key.startswith(code) or len(found) >= limit:
+                break
+            if len(key) == len(code) or key[len(code)] == '-':
+                found.extend(self.keys['article'][key])
+        return found[:limit]
+
+    def lookup(self, code: str) -> list[int]:
+        for field in FIELDS:
+            found = self.get(field, code)
+            if found:
+                return found
+        return self.prefix(code)
+
+    @staticmethod
+    def extract(text: str) -> list[str]:
+        codes = ARTICLE_REGEX.findall(text) + PRODUCTID_REGEX.findall(text)
+        stripped = PRODUCTID_REGEX.sub(' ', text)
+        codes += BARCODE_REGEX.findall(stripped)
+        return list(dict.fromkeys(codes))
+
+    def resolve(self, text: str) -> list[int]:
+        found = []
+        for code in self.extract(text):
+            found.extend(self.lookup(code))
+        return list(dict.fromkeys(found))
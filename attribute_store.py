@@ -0,0 +1,200 @@
+import re
+import json
+from pathlib import Path
+
+import numpy as np
+
+from product_store import save_array
+
+NUMERIC_FIELDS = ('length', 'width', 'height', 'diameter', 'weightbrutto', 'capacity')
+CATEGORICAL_FIELDS = ('brand', 'country', 'etimclass')
+
+# начала названий характеристик из ответа LLM -> поле товара. Длина, ширина,
+# высота и объем в выгрузке — размеры упаковки, поэтому сопоставляются только
+# явные «... упаковки»; «класс» и «марка» у LLM — это класс защиты и марка
+# кабеля, а не etimclass и бренд
+FIELD_ALIASES = {
+    'длина упаковки': 'length',
+    'ширина упаковки': 'width',
+    'высота упаковки': 'height',
+    'объем упаковки': 'capacity',
+    'объём упаковки': 'capacity',
+    'диаметр': 'diameter',
+    'вес': 'weightbrutto',
+    'масс': 'weightbrutto',
+    'бренд': 'brand',
+    'производител': 'brand',
+    'brand': 'brand',
+    'стран': 'country',
+}
+
+# множители к единицам выгрузки; без единицы число считается в них же
+FIELD_UNITS = {
+    'weightbrutto': {'кг': 1.0, 'г': 1e-3, 'гр': 1e-3, 'т': 1e3},
+}
+
+NUMBER = r"(-?\d+(?:[.,]\d+)?)(?:\s*(кг|гр|г|т|мм|см|м)(?![а-яёa-z]))?"
+COMPARATORS = (
+    (re.compile(r"(?<!\w)не\s+(?:дороже|больше|более|выше|длиннее|тяжелее)(?:\s+чем)?\s*" + NUMBER), 'le'),
+    (re.compile(r"(?<!\w)не\s+(?:дешевле|меньше|менее|ниже|короче|легче)(?:\s+чем)?\s*" + NUMBER), 'ge'),
+    (re.compile(r"(?<!\w)(?:минимум|от|>=|≥)\s*" + NUMBER), 'ge'),
+    (re.compile(r"(?<!\w)(?:максимум|до|<=|≤)\s*" + NUMBER), 'le'),
+    (re.compile(r"(?<!\w)(?:дороже|больше|более|выше|свыше|длиннее|тяжелее|>)(?:\s+чем)?\s*" + NUMBER), 'gt'),
+    (re.compile(r"(?<!\w)(?:дешевле|меньше|менее|ниже|короче|легче|<)(?:\s+чем)?\s*" + NUMBER), 'lt'),
+)
+NEGATED_COMPARISON = re.compile(r"^\s*не\s+(?:дороже|дешевле|больше|меньше|более|менее|выше|ниже|длиннее|короче)")
+NEGATION = re.compile(r"^\s*(?:не|без)\s+")
+
+
+def resolve_field(name: str) -> str | None:
+    name = name.strip().lower()
+    for prefix, field in FIELD_ALIASES.items():
+        if name.startswith(prefix):
+            return field
+    return None
+
+
+def parse_comparisons(value: str, units: dict[str, float] | None = None) -> list[tuple[str, float]]:
+    text = value.lower()
+    units = units or {}
+    found = []
+    for regex, op in COMPARATORS:
+        found.extend((op, match.group(1), match.group(2)) for match in regex.finditer(text))
+        text = regex.sub(' ', text)
+    if not found:
+        match = re.search(NUMBER, text)
+        if match:
+            found.append(('eq', match.group(1), match.group(2)))
+    # «от 100 до 500 г»: число без единицы берет последнюю указанную
+    default = next((unit for _, _, unit in reversed(found) if unit in units), None)
+    comparisons = []
+    for op, number, unit in found:
+        scale = units.get(unit if unit in units else default, 1.0)
+        comparisons.append((op, float(number.replace(',', '.')) * scale))
+    return comparisons
+
+
+class AttributeStore:
+    """Колонки характеристик товаров (NumPy), строки выровнены с ProductStore.
+
+    Числовые поля хранятся вместе с порядком сортировки, так что диапазон
+    находится через searchsorted; категориальные — кодами словаря.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.vocab_file = self.directory / 'vocab.json'
+        self.numeric = {}
+        self.order = {}
+        self.sorted = {}
+        self.codes = {}
+        self.vocab = {}
+        self.size = 0
+
+    def write(self, records: list[dict]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for field in NUMERIC_FIELDS:
+            values = np.array([record.get(field) or np.nan for record in records], dtype='float32')
+            values[values <= 0] = np.nan  # 0 в выгрузке означает «не указано»
+            order = np.argsort(values, kind='stable')
+            save_array(self.directory / f'{field}.npy', values)
+            save_array(self.directory / f'{field}.order.npy', order)
+            save_array(self.directory / f'{field}.sorted.npy', values[order])
+        vocab = {}
+        for field in CATEGORICAL_FIELDS:
+            values = [(record.get(field) or '').strip() for record in records]
+            vocab[field] = sorted(set(values) - {''})
+            position = {value: code for code, value in enumerate(vocab[field])}
+            codes = np.array([position.get(value, -1) for value in values], dtype='int32')
+            save_array(self.directory / f'{field}.npy', codes)
+        with open(self.vocab_file, 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+
+    def open(self) -> "AttributeStore":
+        for field in NUMERIC_FIELDS:
+            self.numeric[field] = np.load(self.directory / f'{field}.npy', mmap_mode='r')
+            self.order[field] = np.load(self.directory / f'{field}.order.npy', mmap_mode='r')
+            self.sorted[field] = np.load(self.directory / f'{field}.sorted.npy', mmap_mode='r')
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field] = np.load(self.directory / f'{field}.npy', mmap_mode='r')
+        with open(self.vocab_file, 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        self.size = len(self.codes[CATEGORICAL_FIELDS[0]])
+        return self
+
+    def _range(self, field: str, low: float, high: float, low_inclusive: bool, high_inclusive: bool) -> np.ndarray:
+        order, ordered = self.order[field], self.sorted[field]
+        start = np.searchsorted(ordered, low, side='left' if low_inclusive else 'right')
+        end = np.searchsorted(ordered, high, side='right' if high_inclusive else 'left')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[start:end]] = True
+        return mask
+
+    def _numeric_mask(self, field: str, op: str, number: float) -> np.ndarray:
+        if op == 'eq':
+            tolerance = max(abs(number) * 1e-3, 1e-6)
+            return self._range(field, number - tolerance, number + tolerance, True, True)
+        if op in ('le', 'lt'):
+            return self._range(field, -np.inf, number, True, op == 'le')
+        return self._range(field, number, np.inf, op == 'ge', True)
+
+    def _categorical_mask(self, field: str, value: str) -> np.ndarray:
+        value = value.strip().lower()
+        matched = [code for code, name in enumerate(self.vocab[field]) if value and value in name.lower()]
+        return np.isin(self.codes[field], matched)
+
+    def _predicate(self, field: str, value: str) -> np.ndarray | None:
+        if field in CATEGORICAL_FIELDS:
+            return self._categorical_mask(field, value)
+        comparisons = parse_comparisons(value, FIELD_UNITS.get(field))
+        if not comparisons:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        for op, number in comparisons:
+            mask &= self._numeric_mask(field, op, number)
+        return mask
+
+    def _missing(self, field: str) -> np.ndarray:
+        if field in CATEGORICAL_FIELDS:
+            return np.asarray(self.codes[field]) == -1
+        return np.isnan(self.numeric[field])
+
+    def _characteristic_mask(self, field: str, values: list[str], excluded: bool) -> np.ndarray | None:
+        # исключаемые и категориальные значения — альтернативы, числовые условия — пересечение
+        predicates = [self._predicate(field, value) for value in values]
+        predicates = [predicate for predicate in predicates if predicate is not None]
+        if not predicates:
+            return None
+        if excluded:
+            return np.logical_or.reduce(predicates)
+        if field in CATEGORICAL_FIELDS:
+            predicate = np.logical_or.reduce(predicates)
+        else:
+            predicate = np.logical_and.reduce(predicates)
+        # значение не указано — товар не отбрасываем: неизвестно, что условие не выполнено
+        return predicate | self._missing(field)
+
+    def mask(self, include: dict | None = None, exclude: dict | None = None) -> tuple[np.ndarray, list[str]]:
+        constraints = {}
+        for name, values in (include or {}).items():
+            constraints.setdefault((name, False), []).extend(str(value) for value in values)
+        for name, values in (exclude or {}).items():
+            for value in map(str, values):
+                # «не дороже X» промпт кладёт в exclude, но это условие, которое нужно выполнить
+                if NEGATED_COMPARISON.match(value):
+                    constraints.setdefault((name, False), []).append(value)
+                else:
+                    constraints.setdefault((name, True), []).append(NEGATION.sub('', value))
+
+        mask = np.ones(self.size, dtype=bool)
+        unsupported = []
+        for (name, excluded), values in constraints.items():
+            field = resolve_field(name)
+            predicate = self._characteristic_mask(field, values, excluded) if field else None
+            if predicate is None:
+                unsupported.append(name)
+            elif excluded:
+                mask &= ~predicate
+            else:
+                mask &= predicate
+        return mask, list(dict.fromkeys(unsupported))
@@ -0,0 +1,88 @@
+import asyncio
+
+from rich import print as rprint
+
+from repository import add_audit_batch, run_db
+
+REQUEST = "request"
+RESPONSE = "response"
+MESSAGE = "message"
+
+
+class AuditLog:
+    """Отложенная запись журнала запросов, ответов и истории диалогов.
+
+    Обработчики кладут записи в ограниченную очередь, фоновая задача пишет их
+    пачками в одной транзакции — по накоплении batch_size записей или через
+    interval секунд после первой. Строки для консоли печатаются там же, после
+    записи, а не на пути ответа пользователю.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = asyncio.Queue(maxsize)
+        self.task = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def put(self, kind: str, row: tuple, line: str | None = None) -> None:
+        # при переполнении очереди обработчик ждет писателя, а не теряет записи
+        await self.queue.put((kind, row, line))
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[tuple[str, tuple, str]]) -> None:
+        requests = [row for kind, row, _ in batch if kind == REQUEST]
+        responses = [row for kind, row, _ in batch if kind == RESPONSE]
+        messages = [row for kind, row, _ in batch if kind == MESSAGE]
+        try:
+            await run_db(add_audit_batch, requests, responses, messages)
+        except Exception as e:
+            # одна плохая запись не должна утянуть за собой всю пачку
+            rprint(f"[bold red]AUDIT[/bold red] batch failed: {e}")
+            for kind, row, _ in batch:
+                try:
+                    await run_db(
+                        add_audit_batch,
+                        [row] if kind == REQUEST else [],
+                        [row] if kind == RESPONSE else [],
+                        [row] if kind == MESSAGE else [],
+                    )
+                except Exception as e:
+                    rprint(f"[bold red]AUDIT[/bold red] [cyan]{row[0]}[/cyan] dropped: {e}")
+        for _, _, line in batch:
+            if line is not None:
+                rprint(line)
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    "нужен кабель витая пара категории 5e синий 300 метров",
+    "есть ли в наличии автоматический выключатель на 16А",
+    "какие условия доставки в другой город",
+    "подберите розетку с заземлением белого цвета",
+    "сколько стоит гофра 20 мм, бухта 100 м",
+    "как оформить возврат товара",
+]
+PASSWORD = "bench-password"
+
+
+def load_canned(path: str) -> list[str]:
+    """Ответы модели из logs/context.csv (третья колонка), кроме ошибок."""
+    canned = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            try:
+                output = json.loads(row[2])
+            except ValueError:
+                continue
+            if isinstance(output, dict) and "error" not in output:
+                canned.append(row[2])
+    return canned
+
+
+class FakeModel:
+    """Заменяет модель YandexGPT: те же run_deferred/run_stream, ответ — из
+    канона по хешу запроса, задержка — нормальная с заданным разбросом.
+    Отложенный запрос, как в SDK, готов только к ближайшему опросу статуса."""
+
+    def __init__(self, canned: list[str], latency: float, jitter: float, seed: int):
+        self.canned = canned
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def _delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.random.gauss(self.latency, self.jitter))
+
+    def _answer(self, messages: list[dict]) -> str:
+        return self.canned[zlib.crc32(messages[-1]["text"].encode()) % len(self.canned)]
+
+    @staticmethod
+    def _result(messages: list[dict], text: str) -> SimpleNamespace:
+        input_tokens = sum(len(message["text"]) // 3 + 1 for message in messages)
+        completion_tokens = len(text) // 3 + 1
+        usage = SimpleNamespace(
+            input_text_tokens=input_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=input_tokens + completion_tokens,
+        )
+        return SimpleNamespace(alternatives=[SimpleNamespace(text=text)], usage=usage)
+
+    def run_deferred(self, messages: list[dict]) -> SimpleNamespace:
+        ready_at = time.monotonic() + self._delay()
+
+        def wait(poll_interval: float = 10):
+            # как Operation.wait в SDK: статус проверяется сразу, затем раз в poll_interval
+            while time.monotonic() < ready_at:
+                time.sleep(poll_interval)
+            return self._result(messages, self._answer(messages))
+
+        return SimpleNamespace(wait=wait, cancel=lambda: None)
+
+    def run_stream(self, messages: list[dict]):
+        text = self._answer(messages)
+        chunks = range(16, len(text) + 16, 16)
+        delay = self._delay() / len(chunks)
+        for end in chunks:
+            time.sleep(delay)
+            yield self._result(messages, text[:end])
+
+
+def serve(args):
+    # модель подменяется до импорта api: фаза llm в lifespan вызывает bootstrap
+    import uvicorn
+    import yandex_gpt
+
+    canned = load_canned(args.context)
+    if not canned:
+        raise SystemExit(f"No model answers in {args.context}.")
+    model = FakeModel(canned, args.llm_latency, args.llm_jitter, args.seed)
+    yandex_gpt.bootstrap = lambda: model
+
+    import api
+
+    uvicorn.run(api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_products_stub(port: int, latency: float) -> None:
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        payload = (await request.json()).get("payload", {})
+        await asyncio.sleep(latency)
+        keys = payload.get("include", {}).get("keys", [])
+        return web.json_response({"result_text": "Подобраны товары", "options": keys[:5]})
+
+    app = web.Application()
+    app.router.add_route("*", "/", handle)
+    # свой поток и свой цикл событий, чтобы заглушка не делила его с нагрузкой
+    threading.Thread(
+        target=web.run_app,
+        args=(app,),
+        kwargs={"host": "127.0.0.1", "port": port, "handle_signals": False, "print": None},
+        daemon=True,
+    ).start()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    stages = {}
+    for item in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = item.split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name.strip()] = float(value)
+    return stages
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float, server: subprocess.Popen) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"API exited with code {server.returncode}.")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"API not ready after {timeout}s.")
+
+
+async def drive(args, base_url: str, server: subprocess.Popen) -> tuple[list, list, float]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits, trust_env=False) as client:
+        await wait_ready(client, args.startup_timeout, server)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login(i: int) -> tuple[float, int, str | None]:
+            payload = {
+                "fullname": f"Нагрузка Пользователь{i}",
+                "phone": f"+7900{i:07d}",
+                "inn": f"{7700000000 + i}",
+                "password": PASSWORD,
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                resp = await client.post("/login", json=payload)
+                latency = (time.perf_counter() - start) * 1000
+            token = resp.json().get("token") if resp.status_code == 200 else None
+            return latency, resp.status_code, token
+
+        logins = await asyncio.gather(*(login(i) for i in range(args.users)))
+        tokens = [token for _, _, token in logins if token]
+        if not tokens:
+            raise SystemExit("No user could log in.")
+
+        results = []
+        counter = iter(range(args.requests))
+
+        async def worker():
+            for i in counter:
+                j = i % args.distinct
+                text = f"{QUERIES[j % len(QUERIES)]} {j}"
+                headers = {"Token": tokens[i % len(tokens)], "Origin": "bench"}
+                start = time.perf_counter()
+                try:
+                    resp = await client.post("/chat", json={"text": text}, headers=headers)
+                    status, timing = resp.status_code, resp.headers.get("server-timing", "")
+                except httpx.TransportError:
+                    status, timing = 0, ""
+                results.append(((time.perf_counter() - start) * 1000, status, parse_server_timing(timing)))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return logins, results, elapsed
+
+
+def row(name: str, latencies: list[float], errors: int, rps: str) -> str:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (np.nan,) * 3
+    return f"{name:<8} {len(latencies) + errors:>6} {errors:>6} {rps:>8} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузка на /login и /chat с заглушками YandexGPT (ответы из logs/context.csv) и модуля товаров"
+    )
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--distinct', type=int, default=0, help="разных запросов, 0 — все разные (без попаданий в кэш)")
+    parser.add_argument('--llm-latency', type=float, default=0.8, help="средняя задержка модели, с")
+    parser.add_argument('--llm-jitter', type=float, default=0.2)
+    parser.add_argument('--context-ttl', type=float, help="CONTEXT_TTL сервера, 0 — без истории (кэш и локальный классификатор работают на каждом запросе)")
+    parser.add_argument('--products-latency', type=float, default=0.05)
+    parser.add_argument('--products-engine', choices=("remote", "local"), default="remote")
+    parser.add_argument('--context', default="logs/context.csv")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--max-p95', type=float, help="порог p95 /chat в мс, выше — код выхода 1")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    args.distinct = args.distinct or args.requests
+
+    workdir = tempfile.mkdtemp(prefix="bench_chat_")
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), DB_PATH=os.path.join(workdir, "app.db"), PRODUCTS_ENGINE=args.products_engine)
+    # модели эмбеддингов по умолчанию не поднимаются; включить — через окружение
+    env.setdefault("LOCAL_CLASSIFIER", "false")
+    env.setdefault("RESPONSE_CACHE_SEMANTIC", "false")
+    if args.context_ttl is not None:
+        env["CONTEXT_TTL"] = str(args.context_ttl)
+    if args.products_engine == "remote":
+        products_port = free_port()
+        start_products_stub(products_port, args.products_latency)
+        env["PRODUCTS_MODULE_URL"] = f"http://127.0.0.1:{products_port}/"
+
+    log_path = os.path.join(workdir, "api.log")
+    command = [
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+        "--context", os.path.abspath(args.context), "--seed", str(args.seed),
+        "--llm-latency", str(args.llm_latency), "--llm-jitter", str(args.llm_jitter),
+    ]
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            logins, results, elapsed = asyncio.run(drive(args, f"http://127.0.0.1:{port}", server))
+        finally:
+            server.terminate()
+            server.wait()
+
+    login_ok = [latency for latency, status, _ in logins if status == 200]
+    chat_ok = [latency for latency, status, _ in results if status == 200]
+    stages = {}
+    for _, status, timing in results:
+        for name, duration in timing.items():
+            stages.setdefault(name, []).append(duration)
+
+    print(
+        f"users={args.users} requests={args.requests} concurrency={args.concurrency} distinct={args.distinct} "
+        f"llm={args.llm_latency}±{args.llm_jitter}s products={args.products_engine} log={log_path}"
+    )
+    print(f"{'endpoint':<8} {'n':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print(row("login", login_ok, len(logins) - len(login_ok), "-"))
+    print(row("chat", chat_ok, len(results) - len(chat_ok), f"{len(chat_ok) / elapsed:.1f}"))
+    print(f"{'stage':<8} {'n':>6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, durations in stages.items():
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        print(f"{name:<8} {len(durations):>6} {np.mean(durations):>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+    if args.max_p95 is not None and (not chat_ok or np.percentile(chat_ok, 95) > args.max_p95):
+        raise SystemExit(f"chat p95 above {args.max_p95} ms")
+
+
+if __name__ == '__main__':
+    main()
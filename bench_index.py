@@ -0,0 +1,96 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from index_factory import INDEX_TYPES, build_index, resolve_params, tune_index
+
+
+def make_queries(matrix: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(matrix), size=min(count, len(matrix)), replace=False)
+    queries = matrix[rows] + rng.normal(scale=noise, size=(len(rows), matrix.shape[1])).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def run_queries(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    found = np.empty((len(queries), k), dtype='int64')
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start_time = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies[i] = (time.perf_counter() - start_time) * 1000
+        found[i] = ids[0]
+    return found, latencies
+
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(f[f >= 0], e[e >= 0])) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def sweep(index_type: str, args) -> list[dict]:
+    if index_type.startswith('ivf'):
+        return [{'nprobe': value} for value in args.nprobe]
+    if index_type == 'hnsw':
+        return [{'efSearch': value} for value in args.ef_search]
+    return [{}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k и задержка ANN-индексов относительно Flat")
+    parser.add_argument('--index-dir', default='faiss_index_products')
+    parser.add_argument('--types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 32, 64, 128])
+    parser.add_argument('--save', metavar='TYPE:PARAM=VALUE', help="записать параметры в params.json, напр. hnsw:efSearch=64")
+    args = parser.parse_args()
+
+    index_dir = Path(args.index_dir)
+    matrix = np.load(index_dir / 'embeddings.npy')
+    ids = np.load(index_dir / 'ids.npy')
+    queries = make_queries(matrix, args.queries, args.noise, args.seed)
+
+    baseline = build_index(matrix, ids, resolve_params('flat', len(ids), matrix.shape[1]))
+    expected, _ = run_queries(baseline, queries, args.k)
+
+    print(f"vectors={len(ids)} dim={matrix.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'index':<10} {'params':<18} {'build s':>8} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type in args.types:
+        start_time = time.perf_counter()
+        params = resolve_params(index_type, len(ids), matrix.shape[1])
+        index = build_index(matrix, ids, params)
+        build_time = time.perf_counter() - start_time
+        for search_params in sweep(index_type, args):
+            tune_index(index, search_params)
+            found, latencies = run_queries(index, queries, args.k)
+            label = ','.join(f"{key}={value}" for key, value in search_params.items()) or '-'
+            print(
+                f"{index_type:<10} {label:<18} {build_time:>8.2f} {recall_at_k(found, expected):>7.3f} "
+                f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}"
+            )
+
+    if args.save:
+        index_type, _, assignment = args.save.partition(':')
+        params_file = index_dir / 'params.json'
+        with open(params_file, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+        if params['index_type'] != index_type:
+            raise SystemExit(f"params.json describes a '{params['index_type']}' index, not '{index_type}'.")
+        key, _, value = assignment.partition('=')
+        params[key] = int(value)
+        with open(params_file, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False)
+        print(f"saved {key}={value} to {params_file}")
+
+
+if __name__ == '__main__':
+    main()
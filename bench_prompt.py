@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+
+import numpy as np
+
+from config import CLASSIFIER_HISTORY_LIMIT, categories_meta
+from classifier import load_history
+from conversation import estimate_tokens
+from prompts import COMPACT, FULL, VARIANTS, VERSIONS, expand, select_categories, system_rule
+
+
+def build_messages(rule: str, text: str) -> list[dict]:
+    return [{"role": "system", "text": rule}, {"role": "user", "text": text}]
+
+
+async def run_live(jobs: list[tuple[str, str]], concurrency: int) -> list[tuple[str | None, int]]:
+    # импорт поднимает SDK, поэтому только для --live
+    from yandex_gpt import analyze_query
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(rule: str, text: str) -> tuple[str | None, int]:
+        async with semaphore:
+            output, _, usage = await analyze_query(build_messages(rule, text))
+        return expand(output).get("category"), usage.input_text_tokens if usage else 0
+
+    return await asyncio.gather(*(run_one(rule, text) for rule, text in jobs))
+
+
+async def count_tokens(jobs: list[tuple[str, str]], concurrency: int) -> list[int]:
+    # токены считает сам SDK: инструмент офлайновый, лишний сетевой вызов ничего не стоит
+    from yandex_gpt import bootstrap
+
+    model = bootstrap()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def count_one(rule: str, text: str) -> int:
+        async with semaphore:
+            return len(await asyncio.to_thread(model.tokenize, build_messages(rule, text)))
+
+    return await asyncio.gather(*(count_one(rule, text) for rule, text in jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Размер промптов и совпадение категорий компактного варианта с полным и с историей разметки (Requests + logs/context.csv)"
+    )
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument('--top', type=int, default=5, help="категорий после локального отбора, 0 — все")
+    parser.add_argument('--limit', type=int, default=CLASSIFIER_HISTORY_LIMIT)
+    parser.add_argument('--live', action='store_true', help="прогнать запросы через YandexGPT")
+    parser.add_argument('--estimate', action='store_true', help="оценить токены по длине вместо model.tokenize()")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--min-agreement', type=float, default=0.95)
+    args = parser.parse_args()
+
+    samples = load_history(categories_meta, args.limit)
+    if not samples:
+        raise SystemExit("No labelled requests: need Requests.text in the database and answers in Responses or logs/context.csv.")
+    texts = [text for text, _, _ in samples]
+    expected = np.array([category for _, category, _ in samples])
+
+    ranked = [None] * len(samples)
+    if COMPACT in args.variants and args.top:
+        from services import get_classifier
+
+        classifier = get_classifier()
+        ranked = [classifier.rank(text) for text in texts]
+
+    rules = {}
+    for variant in args.variants:
+        top = args.top if variant == COMPACT else None
+        rules[variant] = [system_rule(variant, order, top) for order in ranked]
+
+    jobs = [(rule, text) for variant in args.variants for rule, text in zip(rules[variant], texts)]
+    if args.estimate:
+        counts = [estimate_tokens(rule) + estimate_tokens(text) for rule, text in jobs]
+    else:
+        counts = asyncio.run(count_tokens(jobs, args.concurrency))
+    footprint = {variant: np.array(counts[i * len(texts):(i + 1) * len(texts)]) for i, variant in enumerate(args.variants)}
+
+    live = {}
+    if args.live:
+        results = asyncio.run(run_live(jobs, args.concurrency))
+        for i, variant in enumerate(args.variants):
+            live[variant] = results[i * len(texts):(i + 1) * len(texts)]
+    # эталон для компактного варианта — ответы текущего промпта на тех же запросах
+    reference = np.array([category for category, _ in live[FULL]]) if FULL in live else None
+
+    kind = "est" if args.estimate else "tok"
+    print(f"samples={len(samples)} top={args.top or 'all'}")
+    print(
+        f"{'variant':<8} {'version':<10} {kind + ' mean':>8} {kind + ' p50':>8} {'cover':>6} "
+        f"{'labels':>6} {'vs full':>7} {'in tok':>7}"
+    )
+    failed = False
+    for variant in args.variants:
+        tokens = footprint[variant]
+        if variant == COMPACT and args.top:
+            # доля запросов, чья размеченная категория пережила локальный отбор
+            cover = np.mean([
+                category in select_categories(order, args.top) for category, order in zip(expected, ranked)
+            ])
+        else:
+            cover = 1.0
+        agree, versus, input_tokens = '-', '-', '-'
+        if variant in live:
+            categories = np.array([category for category, _ in live[variant]])
+            agreement = float(np.mean(categories == expected))
+            agree = f"{agreement:.3f}"
+            if reference is not None and variant != FULL:
+                agreement = float(np.mean(categories == reference))
+                versus = f"{agreement:.3f}"
+            input_tokens = f"{np.mean([tokens for _, tokens in live[variant]]):.0f}"
+            failed |= variant != FULL and agreement < args.min_agreement
+        print(
+            f"{variant:<8} {VERSIONS[variant]:<10} {tokens.mean():>8.0f} {np.percentile(tokens, 50):>8.0f} "
+            f"{cover:>6.3f} {agree:>6} {versus:>7} {input_tokens:>7}"
+        )
+
+    if failed:
+        raise SystemExit(f"agreement below {args.min_agreement}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,94 @@
+import re
+import json
 import time
 from utils import log_request, log_context
-from yandex_gpt import analyze_query
-from repository import update_thread_for_user
+from yandex_gpt import analyze_query, stream_query
+from prompts import expand
+from timing import stage
+from services import (
+    classify_locally,
+    get_cached_response,
+    cache_response,
+    build_system_rule,
+    get_history,
+    remember,
+    conversations,
+)
 
-async def get_response(request_id, user_id, thread_id, query, token, origin):
-    log_request(request_id, user_id, token, origin, query)
+CATEGORY_REGEX = re.compile(r'"category"\s*:\s*"([^"]+)"')
+
+
+async def stream_response(request_id, user_id, query, token, origin, stream_tokens=False, keep_history=True):
+    """Этапы ответа по мере готовности: ("token", {...}) с фрагментами вывода
+    модели, ("category", {...}) как только категория известна и последним —
+    ("analysis", response). Без keep_history запрос идет без истории диалога
+    и в нее не попадает."""
+    await log_request(request_id, user_id, token, origin, query)
 
     start_time = time.time()
-    response, thread, usage = await analyze_query(thread_id, query)
+    history = await get_history(user_id) if keep_history else []
+
+    # кэш и локальный классификатор смотрят только на текст запроса, а уточнение
+    # вроде «а синего цвета?» без истории диалога значит другое — такие запросы
+    # идут в модель и в кэш не попадают
+    response = None
+    if not history:
+        with stage("cache"):
+            cached = await get_cached_response(query)
+        if cached is not None:
+            response, source = cached
+        else:
+            with stage("local"):
+                response, source = await classify_locally(query), "local"
+
+    if response is not None:
+        await log_context(request_id, user_id, response, time.time() - start_time, None, source)
+        if keep_history:
+            await remember(user_id, query, json.dumps(response, ensure_ascii=False))
+        yield "category", {"category": response.get("category"), "source": source}
+        yield "analysis", response
+        return
+
+    with stage("prompt"):
+        rule = await build_system_rule(query)
+        messages = conversations.messages(history, query, rule)
+
+    category = None
+    if stream_tokens:
+        text = ""
+        async for kind, value in stream_query(messages):
+            if kind == "delta":
+                text += value
+                yield "token", {"text": value}
+                match = category is None and CATEGORY_REGEX.search(text)
+                if match:
+                    category = expand({"category": match.group(1)})["category"]
+                    yield "category", {"category": category, "source": "llm"}
+            else:
+                response, text, usage = value
+    else:
+        with stage("llm"):
+            response, text, usage = await analyze_query(messages)
+    response = expand(response)
     end_time = time.time()
 
-    log_context(request_id, user_id, response, end_time - start_time, usage)
+    with stage("log"):
+        await log_context(request_id, user_id, response, end_time - start_time, usage)
+        if not history:
+            await cache_response(query, response)
+        if keep_history and "error" not in response:
+            await remember(user_id, query, text)
+
+    if category is None:
+        yield "category", {"category": response.get("category"), "source": "llm"}
+    yield "analysis", response
 
-    if thread_id != thread.id:
-        update_thread_for_user(user_id, thread.id)
 
+async def get_response(request_id, user_id, query, token, origin, keep_history=True):
+    response = None
+    async for event, data in stream_response(
+        request_id, user_id, query, token, origin, keep_history=keep_history
+    ):
+        if event == "analysis":
+            response = data
     return response
@@ -0,0 +1,78 @@
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from config import LOG_PATH, LOCAL_CATEGORIES
+from indexer import Indexer
+from repository import get_labelled_requests
+
+
+def load_history(categories: dict[str, str], limit: int) -> list[tuple[str, str, str | None]]:
+    labels = {}
+    context_path = Path(LOG_PATH) / "context.csv"
+    if context_path.exists():
+        with open(context_path, encoding="utf-8", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) >= 3:
+                    labels[row[0]] = row[2]
+
+    history = []
+    for request_id, text, response in get_labelled_requests(limit):
+        try:
+            analysis = json.loads(response or labels.get(request_id) or "null")
+        except json.JSONDecodeError:
+            continue
+        if isinstance(analysis, dict) and analysis.get("category") in categories:
+            history.append((text, analysis["category"], analysis.get("намерение")))
+    return history
+
+
+class CategoryClassifier:
+    def __init__(
+        self,
+        indexer: Indexer,
+        categories: dict[str, str],
+        history: list[tuple[str, str, str | None]],
+        threshold: float,
+        margin: float,
+    ):
+        self.indexer = indexer
+        self.threshold = threshold
+        self.margin = margin
+        self.categories = list(categories)
+        position = {category: i for i, category in enumerate(self.categories)}
+
+        texts = list(categories.values()) + [text for text, _, _ in history]
+        self.labels = np.array(
+            list(range(len(self.categories))) + [position[category] for _, category, _ in history]
+        )
+        self.intentions = [None] * len(self.categories) + [intention for _, _, intention in history]
+        self.examples = indexer.embed_texts(texts)
+
+    def _scores(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        scores = self.examples @ self.indexer.embed_query(query)[0]
+        best = np.full(len(self.categories), -np.inf, dtype="float32")
+        np.maximum.at(best, self.labels, scores)
+        return scores, best
+
+    def rank(self, query: str) -> list[str]:
+        _, best = self._scores(query)
+        return [self.categories[i] for i in np.argsort(-best)]
+
+    def classify(self, query: str) -> tuple[str, float, float, str | None]:
+        scores, best = self._scores(query)
+        top, second = np.argsort(-best)[:2]
+        example = int(np.argmax(np.where(self.labels == top, scores, -np.inf)))
+        return self.categories[top], float(best[top]), float(best[top] - best[second]), self.intentions[example]
+
+    def answer(self, query: str) -> dict | None:
+        category, score, margin, intention = self.classify(query)
+        if category not in LOCAL_CATEGORIES or score < self.threshold or margin < self.margin:
+            return None
+        # ближе всего описание категории, а не размеченный запрос: глагола для
+        # «намерение» взять неоткуда, пусть ответит модель
+        if intention is None:
+            return None
+        return {"category": category, "намерение": intention}
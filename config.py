@@ -6,14 +6,77 @@ load_dotenv()
 AUTH = os.getenv("AUTH")
 FOLDER_ID = os.getenv("FOLDER_ID")
 PORT = int(os.getenv("PORT"))
-ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 API_GATEWAY_BASE_URL = os.getenv("API_GATEWAY_BASE_URL")
 PRODUCTS_MODULE_URL = os.getenv("PRODUCTS_MODULE_URL")
+PRODUCTS_ENGINE = os.getenv("PRODUCTS_ENGINE", "remote" if PRODUCTS_MODULE_URL else "local")
+PRODUCTS_THRESHOLD = float(os.getenv("PRODUCTS_THRESHOLD", "0.8"))
+PRODUCTS_LIMIT = int(os.getenv("PRODUCTS_LIMIT", "5"))
+PRODUCTS_HTTP2 = os.getenv("PRODUCTS_HTTP2", "true").lower() == "true"
+PRODUCTS_MAX_CONNECTIONS = int(os.getenv("PRODUCTS_MAX_CONNECTIONS", "100"))
+PRODUCTS_MAX_KEEPALIVE = int(os.getenv("PRODUCTS_MAX_KEEPALIVE", "20"))
+PRODUCTS_TIMEOUT = float(os.getenv("PRODUCTS_TIMEOUT", "10"))
+PRODUCTS_CONNECT_TIMEOUT = float(os.getenv("PRODUCTS_CONNECT_TIMEOUT", "3"))
+PRODUCTS_POOL_TIMEOUT = float(os.getenv("PRODUCTS_POOL_TIMEOUT", "5"))
+PRODUCTS_RETRIES = int(os.getenv("PRODUCTS_RETRIES", "2"))
+PRODUCTS_BACKOFF = float(os.getenv("PRODUCTS_BACKOFF", "0.2"))
+PRODUCTS_BREAKER_THRESHOLD = int(os.getenv("PRODUCTS_BREAKER_THRESHOLD", "5"))
+PRODUCTS_BREAKER_RESET = float(os.getenv("PRODUCTS_BREAKER_RESET", "30"))
 PRODUCT_TYPE = "specified_product__qtype"
 LOG_PATH = "logs"
-DB_PATH = f"{LOG_PATH}/app.db"
+DB_PATH = os.getenv("DB_PATH", f"{LOG_PATH}/app.db")
 TG_PATH = f"{LOG_PATH}/telegram.db"
+TG_GATEWAY_TIMEOUT = float(os.getenv("TG_GATEWAY_TIMEOUT", "35"))
+TG_GATEWAY_CONNECT_TIMEOUT = float(os.getenv("TG_GATEWAY_CONNECT_TIMEOUT", "5"))
+TG_GATEWAY_RETRIES = int(os.getenv("TG_GATEWAY_RETRIES", "2"))
+TG_GATEWAY_BACKOFF = float(os.getenv("TG_GATEWAY_BACKOFF", "0.5"))
+TG_GATEWAY_MAX_CONNECTIONS = int(os.getenv("TG_GATEWAY_MAX_CONNECTIONS", "100"))
+TG_CONCURRENT_UPDATES = int(os.getenv("TG_CONCURRENT_UPDATES", "64"))
+TG_MODE = os.getenv("TG_MODE", "polling")
+TG_WEBHOOK_URL = os.getenv("TG_WEBHOOK_URL")
+TG_WEBHOOK_LISTEN = os.getenv("TG_WEBHOOK_LISTEN", "0.0.0.0")
+TG_WEBHOOK_PORT = int(os.getenv("TG_WEBHOOK_PORT", "8443"))
+TG_WEBHOOK_PATH = os.getenv("TG_WEBHOOK_PATH", "telegram")
+TG_WEBHOOK_SECRET = os.getenv("TG_WEBHOOK_SECRET")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_POLL_INTERVAL = float(os.getenv("LLM_POLL_INTERVAL", "0.2"))
+UVICORN_RELOAD = os.getenv("UVICORN_RELOAD", "false").lower() == "true"
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "full")
+PROMPT_CATEGORIES_TOP = int(os.getenv("PROMPT_CATEGORIES_TOP", "5"))
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "6"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+CONTEXT_MAX_USERS = int(os.getenv("CONTEXT_MAX_USERS", "10000"))
+CONTEXT_TTL = float(os.getenv("CONTEXT_TTL", "86400"))  # секунды; старше — новая сессия
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "true").lower() == "true"
+CATEGORIES_PATH = "metadata/categories.json"
+LOCAL_CLASSIFIER = os.getenv("LOCAL_CLASSIFIER", "true").lower() == "true"
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.85"))
+CLASSIFIER_MARGIN = float(os.getenv("CLASSIFIER_MARGIN", "0.1"))
+CLASSIFIER_HISTORY_LIMIT = int(os.getenv("CLASSIFIER_HISTORY_LIMIT", "5000"))
+# категории, на которые можно ответить без LLM при уверенной локальной классификации
+LOCAL_CATEGORIES = (
+    "order__qtype",
+    "delivery__qtype",
+    "operator_request__qtype",
+    "internal_docs__qtype",
+    "company_general_info__qtype",
+    "sales_info__qtype",
+    "personal_info_change_request__qtype",
+    "other__qtype",
+)
 PROMPT = """
 Список категорий:
 {categories}
@@ -67,7 +130,7 @@ PROMPT = """
 """
 
 
-with open("metadata/categories.json", encoding="utf-8") as f:
+with open(CATEGORIES_PATH, encoding="utf-8") as f:
     categories_meta: dict[str, str] = json.load(f)
     category_keys = list(categories_meta.keys())
     keys_str = ", ".join(category_keys)
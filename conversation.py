@@ -0,0 +1,77 @@
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+from cachetools import LRUCache
+
+USER = "user"
+ASSISTANT = "assistant"
+SYSTEM = "system"
+
+
+def estimate_tokens(text: str) -> int:
+    # у YandexGPT на русском тексте около трех символов на токен;
+    # точный подсчет (tokenize) — лишний сетевой вызов на каждый запрос
+    return len(text) // 3 + 1
+
+
+class ConversationStore:
+    """Последние реплики пользователей для stateless-запросов к модели.
+
+    В памяти — LRU по пользователям, у каждого не больше max_turns пар
+    «запрос — ответ»; на диске — таблица Messages, из которой история
+    поднимается при промахе. В запрос попадают самые свежие пары, пока их
+    сумма не превысит max_tokens, так что размер запроса не зависит от длины
+    диалога. Пары старше ttl секунд не учитываются: после паузы диалог
+    начинается заново.
+    """
+
+    def __init__(self, max_turns: int, max_tokens: int, max_users: int, ttl: float):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self.histories = LRUCache(maxsize=max_users)
+        self.lock = threading.Lock()
+
+    def cutoff(self) -> datetime:
+        return datetime.fromtimestamp(time.time() - self.ttl)
+
+    def history(self, user_id: int) -> list[tuple[str, str, int]] | None:
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            turns = self.histories.get(user_id)
+            if turns is None:
+                return None
+            return [(text, answer, tokens) for text, answer, tokens, created in turns if created > cutoff]
+
+    def load(self, user_id: int, rows: list[tuple[str, str, datetime]]) -> None:
+        turns = deque(maxlen=self.max_turns)
+        for (role, text, _), (next_role, answer, created) in zip(rows, rows[1:]):
+            if role == USER and next_role == ASSISTANT:
+                tokens = estimate_tokens(text) + estimate_tokens(answer)
+                turns.append((text, answer, tokens, created.timestamp()))
+        with self.lock:
+            self.histories.setdefault(user_id, turns)
+
+    def append(self, user_id: int, query: str, answer: str) -> None:
+        turn = (query, answer, estimate_tokens(query) + estimate_tokens(answer), time.time())
+        with self.lock:
+            turns = self.histories.get(user_id)
+            if turns is None:
+                turns = self.histories[user_id] = deque(maxlen=self.max_turns)
+            turns.append(turn)
+
+    def messages(self, history: list[tuple[str, str, int]], query: str, system_rule: str) -> list[dict]:
+        budget = self.max_tokens
+        kept = []
+        for text, answer, tokens in reversed(history):
+            if tokens > budget:
+                break
+            budget -= tokens
+            kept.append(({"role": USER, "text": text}, {"role": ASSISTANT, "text": answer}))
+        messages = [{"role": SYSTEM, "text": system_rule}]
+        for turn in reversed(kept):
+            messages.extend(turn)
+        messages.append({"role": USER, "text": query})
+        return messages
@@ -7,3 +7,8 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     result_text: object
     options: list[str]
+
+
+class BatchRequest(BaseModel):
+    texts: list[str]
+    stream: bool = False
@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+
+# 502 отдает прокси, когда API недоступен; 503 API возвращает уже после разбора запроса
+RETRY_STATUSES = (502,)
+
+
+class GatewayClient:
+    """Асинхронный клиент API для бота: один пул соединений на все чаты.
+
+    Повторяются только попытки, до обработки которых API не дошел (ошибка
+    соединения, 502 от прокси): повтор /chat после таймаута чтения или 503
+    запустил бы разбор запроса второй раз.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        connect_timeout: float,
+        retries: int,
+        backoff: float,
+        max_connections: int,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            trust_env=False,  # API локальный, системный прокси не нужен
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _post(self, path: str, payload: dict, headers: dict | None = None) -> dict:
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self.client.post(path, json=payload, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    resp.raise_for_status()
+                    return resp.json()
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def login(self, payload: dict) -> dict:
+        return await self._post("/login", payload)
+
+    async def chat(self, token: str, text: str) -> dict:
+        return await self._post("/chat", {"text": text}, {"Token": token, "Origin": "Telegram"})
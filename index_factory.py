@@ -0,0 +1,88 @@
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+DEFAULT_PARAMS = {
+    'flat': {},
+    'ivf_flat': {'nlist': None, 'nprobe': 8},
+    'ivf_pq': {'nlist': None, 'm': None, 'nbits': 8, 'nprobe': 16},
+    'hnsw': {'M': 32, 'efConstruction': 80, 'efSearch': 64},
+}
+
+# параметры, которые меняются без перестроения индекса
+SEARCH_PARAMS = ('nprobe', 'efSearch')
+
+
+def resolve_params(index_type: str, n: int, dim: int, params: dict | None = None) -> dict:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}.")
+    resolved = {**DEFAULT_PARAMS[index_type], **(params or {})}
+    if 'nlist' in resolved and not resolved['nlist']:
+        resolved['nlist'] = max(1, min(int(4 * math.sqrt(n)), n // 39 or 1))
+    if 'm' in resolved and not resolved['m']:
+        resolved['m'] = next(m for m in (64, 48, 32, 24, 16, 8, 4, 2, 1) if dim % m == 0)
+    if 'nbits' in resolved:
+        resolved['nbits'] = max(1, min(resolved['nbits'], int(math.log2(max(n // 39, 2)))))
+    resolved['index_type'] = index_type
+    return resolved
+
+
+def build_index(matrix: np.ndarray, ids: np.ndarray, params: dict) -> faiss.Index:
+    index_type = params['index_type']
+    dim = matrix.shape[1]
+    if index_type == 'flat':
+        description = "IDMap,Flat"
+    elif index_type == 'ivf_flat':
+        description = f"IVF{params['nlist']},Flat"
+    elif index_type == 'ivf_pq':
+        description = f"IVF{params['nlist']},PQ{params['m']}x{params['nbits']}"
+    else:
+        description = f"IDMap,HNSW{params['M']},Flat"
+
+    index = faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+    if index_type == 'hnsw':
+        _hnsw(index).hnsw.efConstruction = params['efConstruction']
+    if not index.is_trained:
+        index.train(matrix)
+    index.add_with_ids(matrix, ids)
+    tune_index(index, params)
+    return index
+
+
+def read_index_mmap(path: str, index_type: str) -> faiss.Index:
+    # IVF отображает инвертированные списки (IO_FLAG_MMAP), Flat и HNSW — массив кодов (IO_FLAG_MMAP_IFC);
+    # вместе флаги не работают
+    flag = faiss.IO_FLAG_MMAP if index_type.startswith('ivf') else faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def tune_index(index: faiss.Index, params: dict) -> None:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and params.get('nprobe'):
+        ivf.nprobe = min(params['nprobe'], ivf.nlist)
+    hnsw = _hnsw(index)
+    if hnsw is not None and params.get('efSearch'):
+        hnsw.hnsw.efSearch = params['efSearch']
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    return _hnsw(index) is None
+
+
+def _hnsw(index: faiss.Index):
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
@@ -1,11 +1,34 @@
 import os
 import json
+import time
+import hashlib
+import threading
 from pathlib import Path
 
 import faiss
 import numpy as np
+from cachetools import TTLCache
 from langchain.schema import Document
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from rich import print as rprint
+
+from article_index import ArticleIndex
+from attribute_store import AttributeStore
+from index_factory import (
+    SEARCH_PARAMS,
+    build_index,
+    read_index_mmap,
+    resolve_params,
+    search_parameters,
+    supports_removal,
+    tune_index,
+)
+from product_store import ProductStore, product_document, save_array
+
+
+def normalize_query(query: str) -> str:
+    # общий ключ кэша эмбеддингов и кэша ответов
+    return " ".join(query.lower().split())
 
 
 class Indexer:
@@ -16,111 +39,323 @@ class Indexer:
         product_path: str = 'data_preprocessed',
         product_index_dir: str = 'faiss_index_products',
         embedding_model: str = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2',
+        batch_size: int = 64,
+        index_type: str = 'flat',
+        index_params: dict | None = None,
+        query_cache_size: int = 2048,
+        query_cache_ttl: int = 3600,
     ):
         self.catalog_path = Path(catalog_path)
         self.catalog_index_dir = Path(catalog_index_dir)
         self.product_path = Path(product_path)
         self.product_index_dir = Path(product_index_dir)
         self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.index_type = index_type
+        self.index_params = index_params or {}
         self.catalog_docs = []
-        self.product_docs = []
-        self.embedding = HuggingFaceEmbeddings(model_name=embedding_model)
+        self.product_store = ProductStore(product_index_dir)
+        self.article_index = ArticleIndex()
+        self.attributes = AttributeStore(self.product_index_dir / 'attributes')
+        self.embedding = HuggingFaceEmbeddings(
+            model_name=embedding_model,
+            encode_kwargs={'batch_size': batch_size},
+        )
         self.catalog_index = None
         self.product_index = None
+        self.query_cache = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+        self._query_cache_lock = threading.Lock()
         self.catalog_embeddings_file = self.catalog_index_dir / 'embeddings.npy'
         self.product_embeddings_file = self.product_index_dir / 'embeddings.npy'
         self.catalog_index_file = self.catalog_index_dir / 'index.faiss'
         self.product_index_file = self.product_index_dir / 'index.faiss'
+        self.product_ids_file = self.product_store.ids_file
+        self.product_manifest_file = self.product_index_dir / 'manifest.json'
+        self.product_params_file = self.product_index_dir / 'params.json'
+        self.product_lookup_file = self.product_index_dir / 'lookup.json'
         self._load_data()
         self._ensure_index()
 
     def _load_data(self) -> None:
+        if not self.catalog_path.exists():
+            return
         with open(self.catalog_path, 'r', encoding='utf-8') as f:
             items = json.load(f)
         self.catalog_docs = [Document(page_content=item, metadata={'name': item}) for item in items]
 
-        products_data = []
-        product_docs = []
-        for filename in os.listdir(self.product_path):
-            if not filename.lower().endswith('.json') or filename.lower().startswith('stats'):
-                continue
-            path = os.path.join(self.product_path, filename)
+    def _product_files(self) -> list[Path]:
+        return [
+            path for path in sorted(self.product_path.iterdir())
+            if path.suffix.lower() == '.json' and not path.name.lower().startswith('stats')
+        ]
+
+    @staticmethod
+    def _files_signature(files: list[Path]) -> dict:
+        signature = {}
+        for path in files:
+            stat = path.stat()
+            signature[path.name] = [stat.st_size, stat.st_mtime_ns]
+        return signature
+
+    @staticmethod
+    def _load_products(files: list[Path]) -> dict:
+        product_records = {}
+        for path in files:
             with open(path, "r", encoding="utf-8") as f:
-                products_data.extend(json.load(f))
-        for prod in products_data:
-            title = prod.get("name", "").strip()
-            desc = prod.get("description", "").strip()
-            text = f"{title}\n\n{desc}"
-            product_docs.append(Document(
-                page_content=text,
-                metadata={
-                    "name": title,
-                    "description": desc,
-                    "productid": prod["productid"],
-                    "article": prod["article"],
-                    "brand": prod["brand"],
-                    "country": prod["country"],
-                    "etimclass": prod.get("etimclass")
-                }
-            ))
-        self.product_docs = product_docs
+                for prod in json.load(f):
+                    product_records[prod["productid"]] = prod
+        return product_records
+
+    @staticmethod
+    def _product_hash(prod: dict) -> str:
+        payload = json.dumps(prod, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
     def _ensure_index(self) -> None:
         self.catalog_index_dir.mkdir(parents=True, exist_ok=True)
         if self.catalog_embeddings_file.exists() and self.catalog_index_file.exists():
-            matrix = np.load(self.catalog_embeddings_file)
-            self.catalog_index = faiss.read_index(str(self.catalog_index_file))
-        else:
+            self.catalog_index = read_index_mmap(str(self.catalog_index_file), 'flat')
+        elif self.catalog_docs:
             matrix = self._compute_embeddings(self.catalog_docs)
             np.save(self.catalog_embeddings_file, matrix)
             self.catalog_index = faiss.IndexFlatIP(matrix.shape[1])
             self.catalog_index.add(matrix)
             faiss.write_index(self.catalog_index, str(self.catalog_index_file))
 
+        self._ensure_product_index()
+
+    def _ensure_product_index(self) -> None:
         self.product_index_dir.mkdir(parents=True, exist_ok=True)
-        if self.product_embeddings_file.exists() and self.product_index_file.exists():
-            matrix = np.load(self.product_embeddings_file)
-            self.product_index = faiss.read_index(str(self.catalog_index_file))
-        else:
-            matrix = self._compute_embeddings(self.product_docs)
-            np.save(self.product_embeddings_file, matrix)
-            self.product_index = faiss.IndexFlatIP(matrix.shape[1])
-            self.product_index.add(matrix)
-            faiss.write_index(self.product_index, str(self.product_index_file))
+        files = self._product_files()
+        signature = self._files_signature(files)
+        manifest = {'next_id': 0, 'products': {}}
+        stored_params = None
+        index_files = (
+            self.product_embeddings_file,
+            self.product_ids_file,
+            self.product_index_file,
+            self.product_manifest_file,
+            self.product_params_file,
+        )
+        derived_files = (
+            self.product_store.data_file,
+            self.product_store.offsets_file,
+            self.product_lookup_file,
+            self.attributes.vocab_file,
+        )
+        indexed = all(path.exists() for path in index_files)
+        if indexed:
+            with open(self.product_manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            with open(self.product_params_file, 'r', encoding='utf-8') as f:
+                stored_params = json.load(f)
+
+        rebuild = (
+            not indexed
+            or stored_params['index_type'] != self.index_type
+            or any(
+                stored_params.get(key) != value
+                for key, value in self.index_params.items()
+                if key not in SEARCH_PARAMS
+            )
+        )
+        same_type = stored_params is not None and stored_params['index_type'] == self.index_type
+        params = {**(stored_params if same_type else {}), **self.index_params}
+
+        if not rebuild and manifest.get('files') == signature and all(path.exists() for path in derived_files):
+            self.product_index = read_index_mmap(str(self.product_index_file), self.index_type)
+            tune_index(self.product_index, params)
+            if params != stored_params:
+                with open(self.product_params_file, 'w', encoding='utf-8') as f:
+                    json.dump(params, f, ensure_ascii=False)
+            self.product_store.open()
+            self.article_index = ArticleIndex.load(self.product_lookup_file)
+            self.attributes.open()
+            return
+
+        matrix, ids = None, np.empty(0, dtype='int64')
+        if indexed:
+            matrix = np.load(self.product_embeddings_file, mmap_mode='r')
+            ids = np.load(self.product_ids_file)
+            self.product_index = faiss.read_index(str(self.product_index_file))
+
+        records = self._load_products(files)
+        known = manifest['products']
+        hashes = {pid: self._product_hash(prod) for pid, prod in records.items()}
+        stale = [pid for pid, entry in known.items() if hashes.get(pid) != entry['hash']]
+        fresh = [pid for pid, digest in hashes.items() if known.get(pid, {}).get('hash') != digest]
+
+        if stale:
+            stale_ids = np.array([known.pop(pid)['id'] for pid in stale], dtype='int64')
+            if not rebuild and supports_removal(self.product_index):
+                self.product_index.remove_ids(stale_ids)
+            else:
+                rebuild = True
+            keep = ~np.isin(ids, stale_ids)
+            matrix, ids = matrix[keep], ids[keep]
+
+        if fresh:
+            new_matrix = self._compute_embeddings([product_document(records[pid]) for pid in fresh])
+            new_ids = np.arange(manifest['next_id'], manifest['next_id'] + len(fresh), dtype='int64')
+            if not rebuild:
+                self.product_index.add_with_ids(new_matrix, new_ids)
+            matrix = new_matrix if matrix is None else np.vstack([matrix, new_matrix])
+            ids = np.concatenate([ids, new_ids])
+            for pid, product_id in zip(fresh, new_ids.tolist()):
+                known[pid] = {'id': product_id, 'hash': hashes[pid]}
+            manifest['next_id'] += len(fresh)
+
+        if rebuild and len(ids) > 0:
+            params = resolve_params(self.index_type, len(ids), matrix.shape[1], params)
+            self.product_index = build_index(matrix, ids, params)
+        elif self.product_index is not None:
+            tune_index(self.product_index, params)
+
+        if self.product_index is None:
+            return
+        if stale or fresh:
+            save_array(self.product_embeddings_file, matrix)
+            save_array(self.product_ids_file, ids)
+        if stale or fresh or rebuild:
+            tmp_path = self.product_index_file.with_name(self.product_index_file.name + '.tmp')
+            faiss.write_index(self.product_index, str(tmp_path))
+            os.replace(tmp_path, self.product_index_file)
+        pid_by_id = {entry['id']: pid for pid, entry in known.items()}
+        ordered = [records[pid_by_id[product_id]] for product_id in ids.tolist()]
+        self.product_store.write(ordered)
+        self.article_index = ArticleIndex.build(ordered, ids.tolist())
+        self.article_index.save(self.product_lookup_file)
+        self.attributes.write(ordered)
+        self.attributes.open()
+        with open(self.product_params_file, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False)
+        manifest['files'] = signature
+        with open(self.product_manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        self.product_store.open()
+        rprint(
+            f"[bold yellow]INDEX[/bold yellow] "
+            f"[white]type=[/white][cyan]{self.index_type}[/cyan] "
+            f"[white]products=[/white][cyan]{len(known)}[/cyan] "
+            f"[white]embedded=[/white][green]{len(fresh)}[/green] "
+            f"[white]removed=[/white][magenta]{len(set(stale) - set(hashes))}[/magenta] "
+            f"[white]rebuilt=[/white][grey62]{rebuild}[/grey62]"
+        )
 
     def _compute_embeddings(self, docs: list[Document]) -> np.ndarray:
-        vectors = []
-        for doc in docs:
-            vec = np.array(self.embedding.embed_query(doc.page_content), dtype='float32')
-            vec /= np.linalg.norm(vec)
-            vectors.append(vec)
-        return np.vstack(vectors)
-
-    def search_catalog(self, query: str, threshold: float) -> list[Document]:
-        q_vec = np.array(self.embedding.embed_query(query), dtype='float32')
+        return self.embed_texts([doc.page_content for doc in docs])
+
+    def embed_texts(self, texts: list[str]) -> np.ndarray:
+        start_time = time.perf_counter()
+        matrix = None
+        for start in range(0, len(texts), self.batch_size):
+            batch = np.asarray(
+                self.embedding.embed_documents(texts[start:start + self.batch_size]),
+                dtype='float32',
+            )
+            if matrix is None:
+                matrix = np.empty((len(texts), batch.shape[1]), dtype='float32')
+            matrix[start:start + len(batch)] = batch
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        elapsed = time.perf_counter() - start_time
+        rprint(
+            f"[bold yellow]EMBED[/bold yellow] "
+            f"[white]docs=[/white][cyan]{len(texts)}[/cyan] "
+            f"[white]batch=[/white][magenta]{self.batch_size}[/magenta] "
+            f"[white]time=[/white][grey62]{elapsed:.2f}s[/grey62] "
+            f"[white]throughput=[/white][green]{len(texts) / elapsed:.1f} docs/s[/green]"
+        )
+        return matrix
+
+    def embed_query(self, query: str) -> np.ndarray:
+        key = normalize_query(query)
+        with self._query_cache_lock:
+            q_vec = self.query_cache.get(key)
+            if q_vec is not None:
+                self.query_cache_hits += 1
+                return q_vec
+            self.query_cache_misses += 1
+
+        q_vec = np.array(self.embedding.embed_query(key), dtype='float32')
         q_vec /= np.linalg.norm(q_vec)
-        distances, indices = self.catalog_index.search(q_vec.reshape(1, -1), self.catalog_index.ntotal)
-        results, top = [], None
-        for score, idx in zip(distances[0], indices[0]):
-            top = top or (self.catalog_docs[idx], score)
-            if score < threshold:
-                break
-            results.append(self.catalog_docs[idx])
-        if len(results) > 0: 
-            return results
-        elif threshold - top[1] <= 0.2: 
-            return [top[0]]
-        else: 
+        q_vec = q_vec.reshape(1, -1)
+        q_vec.flags.writeable = False
+        with self._query_cache_lock:
+            self.query_cache[key] = q_vec
+        return q_vec
+
+    def query_cache_stats(self) -> dict:
+        with self._query_cache_lock:
+            return {
+                "hits": self.query_cache_hits,
+                "misses": self.query_cache_misses,
+                "size": len(self.query_cache),
+            }
+
+    @staticmethod
+    def _search(
+        index, q_vec: np.ndarray, threshold: float, k: int | None, params=None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if k is None:
+            _, scores, ids = index.range_search(q_vec, threshold, params=params)
+            order = np.argsort(-scores, kind='stable')
+            return scores[order], ids[order]
+        scores, ids = index.search(q_vec, min(k, index.ntotal), params=params)
+        keep = (ids[0] >= 0) & (scores[0] >= threshold)
+        return scores[0][keep], ids[0][keep]
+
+    @staticmethod
+    def _top(index, q_vec: np.ndarray, params=None) -> tuple[float, int] | None:
+        scores, ids = index.search(q_vec, 1, params=params)
+        if ids[0][0] < 0:
             return None
-    
-    def search_product(self, query: str, threshold: float = 0.95) -> list[Document]:
-        q_vec = np.array(self.embedding.embed_query(query), dtype='float32')
-        q_vec /= np.linalg.norm(q_vec)
-        distances, indices = self.product_index.search(q_vec.reshape(1, -1), self.product_index.ntotal)
-        results, top = [], None
-        for score, idx in zip(distances[0], indices[0]):
-            top = top or (self.product_docs[idx], score)
-            if score < threshold:
-                break
-            results.append(self.product_docs[idx])
-        return results or [top[0]]
\ No newline at end of file
+        return float(scores[0][0]), int(ids[0][0])
+
+    def search_catalog(self, query: str, threshold: float, k: int | None = None) -> list[tuple[Document, float]]:
+        if self.catalog_index is None:
+            return None
+        q_vec = self.embed_query(query)
+        scores, ids = self._search(self.catalog_index, q_vec, threshold, k)
+        if len(ids) > 0:
+            return [(self.catalog_docs[idx], float(score)) for score, idx in zip(scores, ids)]
+        top = self._top(self.catalog_index, q_vec)
+        if top and threshold - top[0] <= 0.2:
+            return [(self.catalog_docs[top[1]], top[0])]
+        return None
+
+    def lookup_products(self, codes: list[str]) -> list[tuple[Document, float]]:
+        found = []
+        for code in codes:
+            found.extend(self.article_index.lookup(code))
+        return [(self.product_store.document(product_id), 1.0) for product_id in dict.fromkeys(found)]
+
+    def filter_products(self, include: dict | None = None, exclude: dict | None = None) -> tuple[np.ndarray, list[str]]:
+        return self.attributes.mask(include, exclude)
+
+    def search_product(
+        self,
+        query: str,
+        threshold: float = 0.95,
+        k: int | None = None,
+        exact: bool = True,
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[Document, float]]:
+        if exact:
+            found = self.lookup_products(self.article_index.extract(query))
+            if found:
+                return found
+        params = None
+        if mask is not None:
+            allowed = np.asarray(self.product_store.ids)[mask]
+            if len(allowed) == 0:
+                return []
+            params = search_parameters(self.product_index, faiss.IDSelectorBatch(allowed))
+        q_vec = self.embed_query(query)
+        scores, ids = self._search(self.product_index, q_vec, threshold, k, params)
+        if len(ids) > 0:
+            return [(self.product_store.document(int(idx)), float(score)) for score, idx in zip(scores, ids)]
+        top = self._top(self.product_index, q_vec, params)
+        return [(self.product_store.document(top[1]), top[0])] if top else []
@@ -1,6 +1,6 @@
 import uvicorn
-from config import PORT
+from config import PORT, UVICORN_RELOAD
 import api  # noqa: F401
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=PORT, reload=True)
+    uvicorn.run("api:app", host="0.0.0.0", port=PORT, reload=UVICORN_RELOAD)
@@ -0,0 +1,96 @@
+import numpy as np
+from langchain.schema import Document
+
+from indexer import Indexer
+
+NOT_FOUND = "Не нашли подходящих товаров. Уточните, пожалуйста, артикул или характеристики."
+UNMET = "Товаров с такими характеристиками не нашли, ближайшие по описанию:"
+OPTION_LENGTH = 64
+
+
+def product_option(doc: Document) -> str:
+    # кнопка отправляет свой текст обратно, артикул в начале находится точным поиском
+    option = f"{doc.metadata['article']} {doc.metadata['name']}"
+    return option if len(option) <= OPTION_LENGTH else option[:OPTION_LENGTH - 1] + "…"
+
+
+def product_line(doc: Document) -> str:
+    meta = doc.metadata
+    return f"{meta['name']} (арт. {meta['article']}, {meta['brand']}, {meta['country']})"
+
+
+class ProductEngine:
+    """Подбор товаров по разбору запроса от LLM внутри процесса.
+
+    Артикулы из include ищутся точно, остальное — семантическим поиском по
+    ключам и характеристикам в пределах маски AttributeStore. Характеристики,
+    которых нет в колонках, уходят в текст запроса, а exclude вычеркивает
+    товары по артикулам, названиям и характеристикам. Если маска отсекла
+    все, поиск повторяется без нее, а ответ говорит, что условие не выполнено.
+    """
+
+    def __init__(self, indexer: Indexer, threshold: float, limit: int):
+        self.indexer = indexer
+        self.threshold = threshold
+        self.limit = limit
+
+    def _excluded_mask(self, articles: list[str]) -> np.ndarray:
+        store = self.indexer.product_store
+        mask = np.ones(len(store), dtype=bool)
+        for code in articles:
+            for product_id in self.indexer.article_index.lookup(str(code)):
+                mask[store.row(product_id)] = False
+        return mask
+
+    def _semantic(self, text: str, mask: np.ndarray | None, excluded_keys: list[str]) -> list[tuple[Document, float]]:
+        found = self.indexer.search_product(
+            text, self.threshold, k=self.limit, exact=False, mask=None if mask is None or mask.all() else mask
+        )
+        return [
+            (doc, score) for doc, score in found
+            if not any(key in doc.metadata["name"].lower() for key in excluded_keys)
+        ]
+
+    def search(self, analysis: dict, query: str = "") -> tuple[list[tuple[Document, float]], bool]:
+        """Найденные товары и признак того, что они проходят условия на характеристики."""
+        include = analysis.get("include") or {}
+        exclude = analysis.get("exclude") or {}
+
+        if include.get("articles"):
+            found = self.indexer.lookup_products([str(code) for code in include["articles"]])
+            if found:
+                return found[:self.limit], True
+
+        attributes, unsupported = self.indexer.filter_products(
+            include.get("characteristics"), exclude.get("characteristics")
+        )
+        allowed = self._excluded_mask(exclude["articles"]) if exclude.get("articles") else None
+        mask = attributes if allowed is None else attributes & allowed
+
+        characteristics = include.get("characteristics") or {}
+        terms = [str(key) for key in include.get("keys") or []]
+        for name in unsupported:
+            terms.extend(f"{name} {value}" for value in characteristics.get(name, []))
+        text = " ".join(terms) or query
+        if not text:
+            return [], True
+
+        excluded_keys = [str(key).lower() for key in exclude.get("keys") or []]
+        found = self._semantic(text, mask, excluded_keys)
+        if found or attributes.all():
+            return found, True
+        # маска строится из разбора LLM и может ошибаться: лучше показать ближайшие
+        # товары с пометкой, чем ничего; исключенные артикулы остаются исключенными
+        return self._semantic(text, allowed, excluded_keys), False
+
+    def resolve(self, analysis: dict, query: str = "") -> tuple[str, list[str]]:
+        found, met = self.search(analysis, query)
+        if not found:
+            return NOT_FOUND, []
+        lines = [product_line(doc) for doc, _ in found]
+        options = [product_option(doc) for doc, _ in found] if len(found) > 1 else []
+        if not met:
+            return UNMET + "\n" + "\n".join(lines), options
+        if len(found) == 1:
+            return f"Нашли товар: {lines[0]}", []
+        return "Подходящие товары:\n" + "\n".join(lines), options
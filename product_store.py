@@ -0,0 +1,87 @@
+import os
+import json
+import mmap
+from pathlib import Path
+
+import numpy as np
+from langchain.schema import Document
+
+
+def product_document(prod: dict) -> Document:
+    title = prod.get("name", "").strip()
+    desc = prod.get("description", "").strip()
+    return Document(
+        page_content=f"{title}\n\n{desc}",
+        metadata={
+            "name": title,
+            "description": desc,
+            "productid": prod["productid"],
+            "article": prod["article"],
+            "brand": prod["brand"],
+            "country": prod["country"],
+            "etimclass": prod.get("etimclass")
+        }
+    )
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    # запись через rename: воркеры, уже отобразившие старый файл, его не теряют
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class ProductStore:
+    """Товары на диске: JSON-записи подряд в products.bin и их смещения в offsets.npy.
+
+    Строки выровнены с ids.npy индекса, файлы открываются через mmap, поэтому
+    несколько воркеров делят одни страницы в кэше ОС, а запись разбирается
+    только для найденного товара.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.data_file = self.directory / 'products.bin'
+        self.offsets_file = self.directory / 'offsets.npy'
+        self.ids_file = self.directory / 'ids.npy'
+        self._data = None
+        self.offsets = None
+        self.ids = None
+
+    def write(self, records: list[dict]) -> None:
+        offsets = np.zeros(len(records) + 1, dtype='int64')
+        tmp_path = self.data_file.with_name(self.data_file.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            for i, record in enumerate(records):
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+                offsets[i + 1] = f.tell()
+        os.replace(tmp_path, self.data_file)
+        save_array(self.offsets_file, offsets)
+
+    def open(self) -> "ProductStore":
+        self.offsets = np.load(self.offsets_file, mmap_mode='r')
+        self.ids = np.load(self.ids_file, mmap_mode='r')
+        if self.offsets[-1] > 0:
+            with open(self.data_file, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, product_id: int) -> int:
+        row = int(np.searchsorted(self.ids, product_id))
+        if row >= len(self.ids) or self.ids[row] != product_id:
+            raise KeyError(product_id)
+        return row
+
+    def record_at(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._data[start:end])
+
+    def record(self, product_id: int) -> dict:
+        return self.record_at(self.row(product_id))
+
+    def document(self, product_id: int) -> Document:
+        return product_document(self.record(product_id))
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import importlib.util
+
+import httpx
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class ProductsUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Размыкается после threshold ошибок подряд и reset секунд не пускает
+    запросы; затем пропускает один пробный, успех снова замыкает цепь."""
+
+    def __init__(self, threshold: int, reset: float):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.reset:
+            return False
+        self.probing = True
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def abort(self) -> None:
+        # попытка прервана без ответа модуля (отмена, прочие ошибки): пробу
+        # засчитываем ошибкой, иначе цепь осталась бы разомкнутой навсегда
+        if self.probing:
+            self.failure()
+
+
+class ProductsClient:
+    """Общий на приложение клиент модуля товаров: пул keep-alive соединений,
+    HTTP/2 при установленном h2, повторы с экспоненциальной паузой и
+    размыкатель, чтобы медленный модуль не копил сокеты и ожидающие запросы."""
+
+    def __init__(
+        self,
+        url: str,
+        http2: bool,
+        max_connections: int,
+        max_keepalive: int,
+        timeout: float,
+        connect_timeout: float,
+        pool_timeout: float,
+        retries: int,
+        backoff: float,
+        breaker_threshold: int,
+        breaker_reset: float,
+    ):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.client = httpx.AsyncClient(
+            http2=http2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def fetch(self, payload: dict) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise ProductsUnavailable("Products module circuit is open.")
+            try:
+                response = await self.client.request("GET", self.url, json=payload)
+            except httpx.PoolTimeout:
+                # пул занят — повтор только удлинит очередь
+                self.breaker.failure()
+                raise
+            except httpx.TransportError:
+                self.breaker.failure()
+                if attempt == self.retries:
+                    raise
+            except BaseException:
+                self.breaker.abort()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.success()
+                    return response
+                self.breaker.failure()
+                if attempt == self.retries:
+                    return response
+            await asyncio.sleep(self.backoff * 2 ** attempt)
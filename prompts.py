@@ -0,0 +1,59 @@
+from functools import lru_cache
+
+from config import PRODUCT_TYPE, SYSTEM_RULE, categories_meta
+
+FULL = "full"
+COMPACT = "compact"
+VARIANTS = (FULL, COMPACT)
+# меняйте версию при любой правке текста промпта: она входит в ключ кэша ответов
+VERSIONS = {FULL: "full-1", COMPACT: "compact-1"}
+
+SUFFIX = "__qtype"
+# без этих категорий модели некуда отнести товарный или посторонний запрос
+ALWAYS_INCLUDED = (PRODUCT_TYPE, "other__qtype")
+
+# неизменная часть идет первой, список категорий — в конце
+COMPACT_PROMPT = """Разбери запрос клиента магазина электротоваров и верни только JSON.
+
+Формат: {{"category": "<код>", "намерение": "<глагол>"}}.
+Для кода {product} добавь "include" и "exclude", оба вида {{"articles": [<артикулы>], "keys": [<тип продукта>], "characteristics": {{"<название>": [<значения>]}}}}.
+include — что запрошено, exclude — что исключено («не», «без»). «не дороже/не более/не выше X» → exclude, «не дешевле/не менее/минимум X» → include.
+Намерение — один глагол.
+
+Категории (код — описание):
+{categories}
+"""
+
+
+def code(category: str) -> str:
+    return category.removesuffix(SUFFIX)
+
+
+def expand(output: dict) -> dict:
+    """Код категории из ответа компактного промпта -> полное имя категории."""
+    category = output.get("category")
+    if isinstance(category, str) and category not in categories_meta and category + SUFFIX in categories_meta:
+        return {**output, "category": category + SUFFIX}
+    return output
+
+
+def select_categories(ranked: list[str], top: int) -> tuple[str, ...]:
+    selected = set(ranked[:top]) | set(ALWAYS_INCLUDED)
+    return tuple(category for category in categories_meta if category in selected)
+
+
+@lru_cache(maxsize=256)
+def compact_rule(categories: tuple[str, ...]) -> str:
+    lines = "\n".join(f"{code(category)} — {categories_meta[category]}" for category in categories)
+    return COMPACT_PROMPT.format(product=code(PRODUCT_TYPE), categories=lines)
+
+
+def system_rule(variant: str, ranked: list[str] | None = None, top: int | None = None) -> str:
+    if variant == FULL:
+        return SYSTEM_RULE
+    categories = select_categories(ranked, top) if ranked and top else tuple(categories_meta)
+    return compact_rule(categories)
+
+
+def prompt_id(variant: str) -> str:
+    return f"{VERSIONS[variant]}\n{system_rule(variant)}"
@@ -1,14 +1,78 @@
+import asyncio
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from config import DB_PATH
+from cachetools import TTLCache
+from config import DB_PATH, DB_POOL_SIZE, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-16000;",
+    "PRAGMA busy_timeout=5000;",
+)
+
+INSERT_USER = "INSERT INTO Users (fullname, INN, phone, password_hash) VALUES (?, ?, ?, ?);"
+SELECT_USER_BY_TOKEN = "SELECT user_id FROM Tokens WHERE id = ?;"
+SELECT_USER_BY_INN = "SELECT id, password_hash FROM Users WHERE INN = ?;"
+SELECT_TOKEN_BY_USER = "SELECT id FROM Tokens WHERE user_id = ?;"
+INSERT_TOKEN = "INSERT INTO Tokens (id, user_id, thread_id) VALUES (?, ?, ?);"
+INSERT_REQUEST = """
+    INSERT INTO Requests (id, user_id, token, origin, request_time, status, text)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+INSERT_RESPONSE = "INSERT INTO Responses (id, user_id, response, source) VALUES (?, ?, ?, ?);"
+INSERT_MESSAGE = "INSERT INTO Messages (user_id, role, text, created) VALUES (?, ?, ?, ?);"
+SELECT_MESSAGES = """
+    SELECT role, text, created FROM (
+        SELECT id, role, text, created FROM Messages WHERE user_id = ? AND created > ? ORDER BY id DESC LIMIT ?
+    ) ORDER BY id;
+"""
+SELECT_LABELLED_REQUESTS = """
+    SELECT r.id, r.text, s.response
+    FROM Requests r LEFT JOIN Responses s ON s.id = r.id
+    WHERE r.text IS NOT NULL AND (s.source IS NULL OR s.source = 'llm')
+    ORDER BY r.request_time DESC
+    LIMIT ?;
+"""
+
+# пул: у каждого потока executor свое долгоживущее соединение
+executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="sqlite")
+_local = threading.local()
+
+# token -> user_id; пишется насквозь при выдаче токена
+sessions = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+sessions_lock = threading.Lock()
 
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
     return conn
 
 
+async def run_db(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
+
+
+def _fetchone(query: str, params: tuple):
+    return get_connection().execute(query, params).fetchone()
+
+
+def _execute(query: str, params: tuple) -> sqlite3.Cursor:
+    conn = get_connection()
+    with conn:
+        return conn.execute(query, params)
+
+
 def init():
     conn = get_connection()
     cursor = conn.cursor()
@@ -58,128 +122,103 @@ def init():
     """
     )
 
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS Messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        text TEXT NOT NULL,
+        created TEXT NOT NULL
+    );
+    """
+    )
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_user_id ON Tokens(user_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_user_id ON Messages(user_id, id);")
+
+    add_column(cursor, "Requests", "text", "TEXT")
+    add_column(cursor, "Responses", "source", "TEXT")
+
     conn.commit()
-    conn.close()
+
+
+def add_column(cursor: sqlite3.Cursor, table: str, column: str, column_type: str) -> None:
+    columns = [row["name"] for row in cursor.execute(f"PRAGMA table_info({table});")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};")
 
 
 def add_new_user(fullname: str, INN: str, phone: str, password_hash: str) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO Users (fullname, INN, phone, password_hash) VALUES (?, ?, ?, ?)",
-            (fullname, INN, phone, password_hash),
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-    finally:
-        conn.close()
-    return user_id
+    cursor = _execute(INSERT_USER, (fullname, INN, phone, password_hash))
+    return cursor.lastrowid
 
 
 def get_user_by_token_id(token: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT user_id FROM Tokens WHERE id = ?;",
-        (token,),
-    )
-    row = cursor.fetchone()
-    conn.close()
+    row = _fetchone(SELECT_USER_BY_TOKEN, (token,))
     if row:
         return row["user_id"]
     return None
 
 
 def get_user_by_INN(INN: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, password_hash FROM Users WHERE INN = ?;",
-        (INN,),
-    )
-    row = cursor.fetchone()
-    conn.close()
+    row = _fetchone(SELECT_USER_BY_INN, (INN,))
     if row:
         return {"id": row["id"], "password_hash": row["password_hash"]}
     return None
 
 
 def get_token_by_user(user_id: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id FROM Tokens WHERE user_id = ?;",
-        (user_id,),
-    )
-    row = cursor.fetchone()
-    conn.close()
+    row = _fetchone(SELECT_TOKEN_BY_USER, (user_id,))
     if row:
         return row["id"]
     return None
 
 
-def get_thread_by_user(user_id: int) -> str:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT thread_id FROM Tokens WHERE user_id = ? LIMIT 1;",
-        (user_id,),
-    )
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return row["thread_id"]
-    return None
+def cached_session(token: str) -> int | None:
+    with sessions_lock:
+        return sessions.get(token)
 
 
-def update_thread_for_user(user_id: int, thread_id: str) -> None:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE Tokens SET thread_id = ? WHERE user_id = ?;",
-        (thread_id, user_id),
-    )
-    conn.commit()
-    conn.close()
+def get_session(token: str) -> int | None:
+    user_id = cached_session(token)
+    if user_id is not None:
+        return user_id
+    user_id = get_user_by_token_id(token)
+    if user_id is None:
+        return None
+    with sessions_lock:
+        sessions[token] = user_id
+    return user_id
 
 
 def add_token(user_id: int, token: str) -> None:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO Tokens (id, user_id, thread_id) VALUES (?, ?, ?)",
-        (token, user_id, None),
-    )
-    conn.commit()
-    conn.close()
+    _execute(INSERT_TOKEN, (token, user_id, None))
+    with sessions_lock:
+        sessions[token] = user_id
 
 
-def add_request(request_id: str, user_id: int, token: str, origin: str) -> str:
-    request_time = datetime.now().isoformat()
-    status = "Новый"
+def request_row(request_id: str, user_id: int, token: str, origin: str, text: str = None) -> tuple:
+    return request_id, user_id, token, origin, datetime.now().isoformat(), "Новый", text
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO Requests (id, user_id, token, origin, request_time, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (request_id, user_id, token, origin, request_time, status),
-    )
-    conn.commit()
-    conn.close()
-    return request_id
+
+def message_row(user_id: int, role: str, text: str) -> tuple:
+    return user_id, role, text, datetime.now().isoformat()
 
 
-def add_response(request_id: str, user_id: int, response: str) -> str:
+def get_messages(user_id: int, limit: int, since: datetime) -> list[tuple[str, str, datetime]]:
+    rows = get_connection().execute(SELECT_MESSAGES, (user_id, since.isoformat(), limit)).fetchall()
+    return [(row["role"], row["text"], datetime.fromisoformat(row["created"])) for row in rows]
+
+
+def add_audit_batch(requests: list[tuple], responses: list[tuple], messages: list[tuple] = ()) -> None:
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO Responses (id, user_id, response) VALUES (?, ?, ?)",
-        (request_id, user_id, response),
-    )
-    conn.commit()
-    conn.close()
-    return request_id
+    with conn:
+        conn.executemany(INSERT_REQUEST, requests)
+        conn.executemany(INSERT_RESPONSE, responses)
+        conn.executemany(INSERT_MESSAGE, messages)
+
+
+def get_labelled_requests(limit: int) -> list[tuple[str, str, str]]:
+    rows = get_connection().execute(SELECT_LABELLED_REQUESTS, (limit,)).fetchall()
+    return [(row["id"], row["text"], row["response"]) for row in rows]
@@ -0,0 +1,94 @@
+import re
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from cachetools import TTLCache
+
+from indexer import normalize_query
+
+NUMBERS_REGEX = re.compile(r"\d+(?:[.,\-]\d+)*")
+
+
+class ResponseCache:
+    """Двухуровневый кэш результатов analyze_query.
+
+    Первый уровень — точное совпадение нормализованного текста, второй —
+    косинусная близость эмбеддингов не ниже threshold. Во втором уровне числа
+    запроса (артикулы, цены, размеры) должны совпадать, иначе «артикул 42-0037»
+    и «артикул 42-0038» получили бы один ответ. Кэш сбрасывается, если меняется
+    системный промпт или categories.json.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        threshold: float,
+        system_rule: str,
+        categories_path: str,
+        embed: Callable[[str], np.ndarray] | None = None,
+    ):
+        self.threshold = threshold
+        self.system_rule = system_rule
+        self.categories_path = Path(categories_path)
+        self.embed = embed
+        self.exact = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.semantic = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self._categories_mtime = None
+        self._fingerprint = None
+        self._keys = []
+        self._matrix = None
+
+    def _check_version(self) -> None:
+        mtime = self.categories_path.stat().st_mtime_ns
+        if mtime == self._categories_mtime:
+            return
+        digest = hashlib.sha256(self.system_rule.encode("utf-8"))
+        digest.update(self.categories_path.read_bytes())
+        fingerprint = digest.hexdigest()
+        if fingerprint != self._fingerprint:
+            self.exact.clear()
+            self.semantic.clear()
+            self._matrix = None
+        self._categories_mtime, self._fingerprint = mtime, fingerprint
+
+    def get_exact(self, query: str) -> dict | None:
+        with self.lock:
+            self._check_version()
+            return self.exact.get(normalize_query(query))
+
+    def get_similar(self, query: str) -> dict | None:
+        if self.embed is None:
+            return None
+        key = normalize_query(query)
+        q_vec = self.embed(key)[0]
+        numbers = NUMBERS_REGEX.findall(key)
+        with self.lock:
+            self._check_version()
+            if self._matrix is None:
+                self._keys = list(self.semantic.keys())
+                self._matrix = np.vstack([self.semantic[k][0] for k in self._keys]) if self._keys else None
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ q_vec
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                entry = self.semantic.get(self._keys[i])
+                if entry is not None and entry[1] == numbers:
+                    return entry[2]
+        return None
+
+    def put(self, query: str, response: dict) -> None:
+        key = normalize_query(query)
+        q_vec = self.embed(key)[0] if self.embed is not None else None
+        with self.lock:
+            self._check_version()
+            self.exact[key] = response
+            if q_vec is not None:
+                self.semantic[key] = (q_vec, NUMBERS_REGEX.findall(key), response)
+                self._matrix = None
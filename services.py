@@ -0,0 +1,160 @@
+import asyncio
+import threading
+
+from config import (
+    CATEGORIES_PATH,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_SEMANTIC,
+    INDEX_TYPE,
+    LOCAL_CLASSIFIER,
+    CLASSIFIER_THRESHOLD,
+    CLASSIFIER_MARGIN,
+    CLASSIFIER_HISTORY_LIMIT,
+    PRODUCTS_ENGINE,
+    PRODUCTS_THRESHOLD,
+    PRODUCTS_LIMIT,
+    PROMPT_VARIANT,
+    PROMPT_CATEGORIES_TOP,
+    CONTEXT_MAX_TURNS,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_MAX_USERS,
+    CONTEXT_TTL,
+    categories_meta,
+)
+from repository import get_messages, message_row, run_db
+from audit_log import MESSAGE
+from conversation import ConversationStore, USER, ASSISTANT
+from utils import audit_log
+from indexer import Indexer
+from product_engine import ProductEngine
+from classifier import CategoryClassifier, load_history
+from response_cache import ResponseCache
+from prompts import FULL, prompt_id, system_rule
+
+_indexer = None
+_indexer_lock = threading.Lock()
+_classifier = None
+_classifier_lock = threading.Lock()
+_product_engine = None
+_product_engine_lock = threading.Lock()
+response_cache = ResponseCache(
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_THRESHOLD,
+    prompt_id(PROMPT_VARIANT),
+    CATEGORIES_PATH,
+    embed=(lambda query: get_indexer().embed_query(query)) if RESPONSE_CACHE_SEMANTIC else None,
+)
+
+conversations = ConversationStore(CONTEXT_MAX_TURNS, CONTEXT_MAX_TOKENS, CONTEXT_MAX_USERS, CONTEXT_TTL)
+
+
+def get_indexer() -> Indexer:
+    global _indexer
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = Indexer(index_type=INDEX_TYPE)
+    return _indexer
+
+
+def get_classifier() -> CategoryClassifier:
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = CategoryClassifier(
+                get_indexer(),
+                categories_meta,
+                load_history(categories_meta, CLASSIFIER_HISTORY_LIMIT),
+                CLASSIFIER_THRESHOLD,
+                CLASSIFIER_MARGIN,
+            )
+    return _classifier
+
+
+def get_product_engine() -> ProductEngine:
+    global _product_engine
+    with _product_engine_lock:
+        if _product_engine is None:
+            _product_engine = ProductEngine(get_indexer(), PRODUCTS_THRESHOLD, PRODUCTS_LIMIT)
+    return _product_engine
+
+
+def warmup() -> None:
+    """Загружает модель эмбеддингов, индексы и классификатор, если они нужны
+    на горячем пути, чтобы первый запрос не платил за холодный старт."""
+    uses_classifier = LOCAL_CLASSIFIER or PROMPT_VARIANT != FULL
+    if not (uses_classifier or RESPONSE_CACHE_SEMANTIC or PRODUCTS_ENGINE == "local"):
+        return
+    get_indexer().embed_query("прогрев")
+    if uses_classifier:
+        get_classifier()
+    if PRODUCTS_ENGINE == "local":
+        get_product_engine()
+
+
+async def resolve_products(analysis: dict, query: str) -> tuple[str, list[str]]:
+    engine = await asyncio.to_thread(get_product_engine)
+    return await asyncio.to_thread(engine.resolve, analysis, query)
+
+
+async def classify_locally(query: str) -> dict | None:
+    if not LOCAL_CLASSIFIER:
+        return None
+    try:
+        classifier = await asyncio.to_thread(get_classifier)
+        return await asyncio.to_thread(classifier.answer, query)
+    except Exception as e:
+        print(e)
+        return None
+
+
+async def get_cached_response(query: str) -> tuple[dict, str] | None:
+    response = response_cache.get_exact(query)
+    if response is not None:
+        return response, "cache:exact"
+    try:
+        response = await asyncio.to_thread(response_cache.get_similar, query)
+    except Exception as e:
+        print(e)
+        return None
+    if response is not None:
+        return response, "cache:semantic"
+    return None
+
+
+async def cache_response(query: str, response: dict) -> None:
+    if "error" in response:
+        return
+    try:
+        await asyncio.to_thread(response_cache.put, query, response)
+    except Exception as e:
+        print(e)
+
+
+async def build_system_rule(query: str) -> str:
+    if PROMPT_VARIANT == FULL:
+        return system_rule(FULL)
+    try:
+        classifier = await asyncio.to_thread(get_classifier)
+        ranked = await asyncio.to_thread(classifier.rank, query)
+    except Exception as e:
+        # без предварительного отбора компактный промпт перечисляет все категории
+        print(e)
+        ranked = None
+    return system_rule(PROMPT_VARIANT, ranked, PROMPT_CATEGORIES_TOP)
+
+
+async def get_history(user_id: int) -> list[tuple[str, str, int]]:
+    history = conversations.history(user_id)
+    if history is None:
+        conversations.load(user_id, await run_db(get_messages, user_id, 2 * CONTEXT_MAX_TURNS, conversations.cutoff()))
+        history = conversations.history(user_id)
+    return history
+
+
+async def remember(user_id: int, query: str, answer: str) -> None:
+    conversations.append(user_id, query, answer)
+    await audit_log.put(MESSAGE, message_row(user_id, USER, query))
+    await audit_log.put(MESSAGE, message_row(user_id, ASSISTANT, answer))
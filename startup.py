@@ -0,0 +1,61 @@
+import time
+import asyncio
+from typing import Callable
+
+from rich import print as rprint
+
+
+class Startup:
+    """Фазы запуска API. Выполняются параллельно в потоках; время и ошибки
+    каждой фазы отдает report(), на нем построен /ready."""
+
+    def __init__(self, phases: dict[str, Callable[[], object]]):
+        self.phases = phases
+        self.tasks = {}
+        self.timings = {}
+        self.errors = {}
+
+    def start(self) -> None:
+        self.tasks = {name: asyncio.create_task(self._run(name, func)) for name, func in self.phases.items()}
+
+    async def _run(self, name: str, func: Callable[[], object]) -> None:
+        start_time = time.perf_counter()
+        try:
+            await asyncio.to_thread(func)
+        except Exception as e:
+            self.errors[name] = str(e)
+        self.timings[name] = round(time.perf_counter() - start_time, 3)
+        status = f"[red]error={self.errors[name]}[/red]" if name in self.errors else "[green]ok[/green]"
+        rprint(
+            f"[bold magenta]STARTUP[/bold magenta] "
+            f"[white]phase=[/white][cyan]{name}[/cyan] "
+            f"[white]time=[/white][yellow]{self.timings[name]}s[/yellow] {status}"
+        )
+
+    async def wait(self, name: str) -> None:
+        await self.tasks[name]
+        if name in self.errors:
+            raise RuntimeError(f"Startup phase '{name}' failed: {self.errors[name]}")
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.tasks) and all(task.done() for task in self.tasks.values()) and not self.errors
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "phases": {
+                name: {
+                    "done": task.done(),
+                    "time": self.timings.get(name),
+                    "error": self.errors.get(name),
+                }
+                for name, task in self.tasks.items()
+            },
+        }
+
+    async def stop(self) -> None:
+        # поток фазы не прервать, но ждать его при остановке незачем
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
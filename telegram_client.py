@@ -1,10 +1,25 @@
-import os
 import re
 import json
 import logging
-import requests
 
-from config import API_GATEWAY_BASE_URL, BOT_TOKEN
+from config import (
+    API_GATEWAY_BASE_URL,
+    BOT_TOKEN,
+    TG_GATEWAY_TIMEOUT,
+    TG_GATEWAY_CONNECT_TIMEOUT,
+    TG_GATEWAY_RETRIES,
+    TG_GATEWAY_BACKOFF,
+    TG_GATEWAY_MAX_CONNECTIONS,
+    TG_CONCURRENT_UPDATES,
+    TG_MODE,
+    TG_WEBHOOK_URL,
+    TG_WEBHOOK_LISTEN,
+    TG_WEBHOOK_PORT,
+    TG_WEBHOOK_PATH,
+    TG_WEBHOOK_SECRET,
+)
+from gateway_client import GatewayClient
+from update_processor import ChatOrderedUpdateProcessor
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
@@ -12,6 +27,7 @@ from telegram import (
     KeyboardButton,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
@@ -38,7 +54,21 @@ logger = logging.getLogger(__name__)
 
 PHONE_REGEX = re.compile(r"^(?:\+7|8)\d{10}$")
 INN_REGEX = re.compile(r"^\d{10}|\d{12}$")
-os.environ["NO_PROXY"] = "localhost,127.0.0.1"
+
+
+async def post_init(application: Application):
+    application.bot_data["gateway"] = GatewayClient(
+        API_GATEWAY_BASE_URL,
+        timeout=TG_GATEWAY_TIMEOUT,
+        connect_timeout=TG_GATEWAY_CONNECT_TIMEOUT,
+        retries=TG_GATEWAY_RETRIES,
+        backoff=TG_GATEWAY_BACKOFF,
+        max_connections=TG_GATEWAY_MAX_CONNECTIONS,
+    )
+
+
+async def post_shutdown(application: Application):
+    await application.bot_data["gateway"].aclose()
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
@@ -105,10 +135,7 @@ async def ask_inn(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
 
     try:
-        url = f"{API_GATEWAY_BASE_URL.rstrip('/')}/login"
-        resp = requests.post(url, json=payload, timeout=10, proxies={"http": None})
-        resp.raise_for_status()
-        data = resp.json()
+        data = await context.bot_data["gateway"].login(payload)
     except Exception as e:
         logger.error(f"Ошибка при запросе /login: {e}")
         await update.message.reply_text(
@@ -158,17 +185,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user_text:
         return
 
-    headers = {
-        "Token": token,
-        "Origin": "Telegram",
-    }
-    payload = {"text": user_text}
-
     try:
-        url = f"{API_GATEWAY_BASE_URL.rstrip('/')}/chat"
-        resp = requests.post(url, json=payload, headers=headers, timeout=10, proxies={"http": None})
-        resp.raise_for_status()
-        data = resp.json()
+        data = await context.bot_data["gateway"].chat(token, user_text)
     except Exception as e:
         logger.error(f"Ошибка при запросе /chat: {e}")
         await update.message.reply_text(
@@ -185,13 +203,12 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if options:
         keyboard = [[KeyboardButton(opt)] for opt in options]
-
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
-    await update.message.reply_text(
-        "Выберите вариант ответа:", reply_markup=reply_markup
-    )
+        reply_markup = ReplyKeyboardMarkup(
+            keyboard, resize_keyboard=True, one_time_keyboard=True
+        )
+        await update.message.reply_text(
+            "Выберите вариант ответа:", reply_markup=reply_markup
+        )
 
 
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -201,7 +218,14 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def main():
     init_db()
 
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+    application = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(TG_CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start_command)],
         states={
@@ -220,8 +244,19 @@ def main():
     )
     application.add_handler(MessageHandler(filters.COMMAND, unknown_command))
 
-    logger.info("Бот запущен.")
-    application.run_polling()
+    if TG_MODE == "webhook":
+        # Telegram шлет апдейты на TG_WEBHOOK_URL, его проксируют на локальный сервер PTB
+        logger.info(f"Бот запущен (webhook, {TG_WEBHOOK_LISTEN}:{TG_WEBHOOK_PORT}/{TG_WEBHOOK_PATH}).")
+        application.run_webhook(
+            listen=TG_WEBHOOK_LISTEN,
+            port=TG_WEBHOOK_PORT,
+            url_path=TG_WEBHOOK_PATH,
+            webhook_url=TG_WEBHOOK_URL,
+            secret_token=TG_WEBHOOK_SECRET,
+        )
+    else:
+        logger.info("Бот запущен.")
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from products_client import ProductsClient, ProductsUnavailable
+
+
+def make_client(handler) -> ProductsClient:
+    client = ProductsClient(
+        "http://products/",
+        http2=False,
+        max_connections=4,
+        max_keepalive=4,
+        timeout=5,
+        connect_timeout=1,
+        pool_timeout=1,
+        retries=0,
+        backoff=0,
+        breaker_threshold=1,
+        breaker_reset=0,
+    )
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_cancelled_probe_does_not_keep_circuit_open():
+    mode = {"value": "fail"}
+    hang = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if mode["value"] == "fail":
+            raise httpx.ConnectError("down", request=request)
+        if mode["value"] == "hang":
+            await hang.wait()
+        return httpx.Response(200, json={"result_text": "ok", "options": []})
+
+    async def scenario():
+        client = make_client(handler)
+        with pytest.raises(httpx.ConnectError):
+            await client.fetch({})
+        assert client.breaker.opened_at is not None
+
+        mode["value"] = "hang"
+        probe = asyncio.create_task(client.fetch({}))
+        await asyncio.sleep(0.05)
+        assert client.breaker.probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not client.breaker.probing
+
+        mode["value"] = "ok"
+        response = await client.fetch({})
+        assert response.status_code == 200
+        assert client.breaker.opened_at is None
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_open_circuit_rejects_until_reset():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("down", request=request)
+
+    async def scenario():
+        client = make_client(handler)
+        client.breaker.reset = 60
+        with pytest.raises(httpx.ConnectError):
+            await client.fetch({})
+        with pytest.raises(ProductsUnavailable):
+            await client.fetch({})
+        await client.aclose()
+
+    asyncio.run(scenario())
@@ -1,8 +1,26 @@
 import sqlite3
+import threading
 from config import TG_PATH
 
+# свои, а не из repository: тот при импорте поднимает пул и кэш сессий API
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA busy_timeout=5000;",
+)
+
+# одно соединение на процесс бота и все токены в памяти: чтение — поиск в словаре,
+# запись — сразу в базу и в словарь
+_conn = None
+_tokens: dict[int, str] = {}
+_lock = threading.Lock()
+
+
 def init_db():
-    conn = sqlite3.connect(TG_PATH)
+    global _conn
+    conn = sqlite3.connect(TG_PATH, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -13,30 +31,27 @@ def init_db():
         """
     )
     conn.commit()
-    conn.close()
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = conn
+        _tokens.clear()
+        _tokens.update(cursor.execute("SELECT chat_id, token FROM users WHERE token IS NOT NULL"))
 
 
 def get_token(chat_id: int) -> str:
-    conn = sqlite3.connect(TG_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT token FROM users WHERE chat_id = ?", (chat_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return row[0]
-    return None
+    return _tokens.get(chat_id)
 
 
 def save_token(chat_id: int, token: str):
-    conn = sqlite3.connect(TG_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO users (chat_id, token)
-        VALUES (?, ?)
-        ON CONFLICT(chat_id) DO UPDATE SET token=excluded.token
-        """,
-        (chat_id, token),
-    )
-    conn.commit()
-    conn.close()
+    with _lock:
+        with _conn:
+            _conn.execute(
+                """
+                INSERT INTO users (chat_id, token)
+                VALUES (?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET token=excluded.token
+                """,
+                (chat_id, token),
+            )
+        _tokens[chat_id] = token
@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# этапы текущего запроса: имя -> миллисекунды; пустой контекст — замер выключен
+_stages: ContextVar[dict | None] = ContextVar("stages", default=None)
+
+
+def start_timing() -> dict[str, float]:
+    stages = {}
+    _stages.set(stages)
+    return stages
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = _stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def server_timing(stages: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in stages.items())
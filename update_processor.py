@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# семафор PTB только считает апдейты в работе; настоящий предел — свой, после очереди чата
+PTB_BOUND = 2 ** 16
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Апдейты одного чата обрабатываются строго по очереди, разных чатов —
+    параллельно, но не больше max_concurrent_updates одновременно.
+
+    process_update в PTB финальный, поэтому очередь чата стоит внутри
+    do_process_update, а семафор PTB заведен с запасом. Предел параллельности
+    держит свой семафор, который берется уже внутри очереди чата: серия
+    сообщений из одного чата не занимает слоты, нужные остальным.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max(PTB_BOUND, max_concurrent_updates))
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chats = {}  # chat_id -> [lock, число ожидающих]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chats.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
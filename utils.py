@@ -1,7 +1,10 @@
 import pathlib, json, hashlib
 from datetime import datetime
-from rich import print as rprint
-from repository import add_request, add_response
+from audit_log import AuditLog, REQUEST, RESPONSE
+from config import AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL
+from repository import request_row
+
+audit_log = AuditLog(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL)
 
 
 def hash_password(password: str) -> str:
@@ -10,12 +13,13 @@ def hash_password(password: str) -> str:
 def local_path(path: str) -> pathlib.Path:
     return pathlib.Path(__file__).parent / path
 
-def log_request(request_id: str, user_id: str, token: str, source: str, query: str):
+async def log_request(request_id: str, user_id: str, token: str, source: str, query: str):
     preview = query[:50] + ("…" if len(query) > 50 else "")
     timestamp = datetime.now().strftime("%D.%M.%Y")
 
-    add_request(request_id, user_id, token, source)
-    rprint(
+    await audit_log.put(
+        REQUEST,
+        request_row(request_id, user_id, token, source, query),
         f"[bold green]REQUEST[/bold green] "
         f"[white]id=[/white][cyan]{request_id}[/cyan] "
         f"[white]user=[/white][magenta]{user_id}[/magenta] "
@@ -24,16 +28,18 @@ def log_request(request_id: str, user_id: str, token: str, source: str, query: s
         f"[white]preview=[/white][grey62]{preview}[/grey62]"
     )
 
-def log_context(request_id: str, user_id: str, response_obj: object, time: int, usage: any):
+async def log_context(request_id: str, user_id: str, response_obj: object, time: int, usage: any, source: str = "llm"):
     response_json_str = json.dumps(response_obj, ensure_ascii=False)
 
-    add_response(request_id, user_id, response_json_str)
-    rprint(
+    await audit_log.put(
+        RESPONSE,
+        (request_id, user_id, response_json_str, source),
         f"[bold blue]CONTEXT[/bold blue] "
         f"[white]id=[/white][cyan]{request_id}[/cyan] "
         f"[white]user=[/white][magenta]{user_id}[/magenta] "
+        f"[white]source=[/white][green]{source}[/green] "
         f"[white]response time=[/white][grey62]{time}s[/grey62] "
-        f"[white]input tokens=[/white][grey62]{usage.input_text_tokens}[/grey62] "
-        f"[white]output tokens=[/white][grey62]{usage.completion_tokens}[/grey62] "
-        f"[white]total tokens=[/white][grey62]{usage.total_tokens}[/grey62]"
+        f"[white]input tokens=[/white][grey62]{usage.input_text_tokens if usage else 0}[/grey62] "
+        f"[white]output tokens=[/white][grey62]{usage.completion_tokens if usage else 0}[/grey62] "
+        f"[white]total tokens=[/white][grey62]{usage.total_tokens if usage else 0}[/grey62]"
     )
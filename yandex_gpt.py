@@ -1,46 +1,131 @@
-import json, re, os
-from config import AUTH, FOLDER_ID, ASSISTANT_ID, SYSTEM_RULE
-from yandex_cloud_ml_sdk import YCloudML
-
-assistant = None
-sdk = YCloudML(folder_id=FOLDER_ID, auth=AUTH)
-model = sdk.models.completions("yandexgpt-lite").configure(
-    temperature=0.0, max_tokens=200
-)
-
-sdk.setup_default_logging()
-
-if ASSISTANT_ID:
-    assistant = sdk.assistants.get(ASSISTANT_ID)
-if not assistant:
-    assistant = sdk.assistants.create(
-        model, ttl_days=4, expiration_policy="since_last_active", max_tokens=500
-    )
-    os.environ["ASSISTANT_ID"] = assistant.id
-
-
-async def analyze_query(thread_id: str, query: str) -> tuple[dict, any, any]:
-
-    # TODO: добавить обновление треда
-    # TODO: добавить обновление ассистента
-    # TODO: добавить удаление тренда
-
-    thread = None
-    if thread_id:
-        thread = sdk.threads.get(thread_id)
-    if not thread:
-        thread = sdk.threads.create(
-            name="SimpleAssistant", ttl_days=1, expiration_policy="static"
-        )
-        thread.write({"text": SYSTEM_RULE, "role": "USER"})
-
-    thread.write(query)
-    run = assistant.run(thread, custom_prompt_truncation_strategy="auto")
-    result = run.wait()
+import json, re
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import AUTH, FOLDER_ID, LLM_CONCURRENCY, LLM_TIMEOUT, LLM_POLL_INTERVAL
 
+sdk = None
+model = None
+_bootstrap_lock = threading.Lock()
+
+# SDK синхронный: вызовы идут в отдельном пуле, чтобы не блокировать event loop
+executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="yandex-gpt")
+semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+
+def bootstrap():
+    """Поднимает SDK при первом обращении; api.lifespan вызывает заранее."""
+    global sdk, model
+    with _bootstrap_lock:
+        if model is None:
+            from yandex_cloud_ml_sdk import YCloudML
+
+            sdk = YCloudML(folder_id=FOLDER_ID, auth=AUTH)
+            sdk.setup_default_logging()
+            model = sdk.models.completions("yandexgpt-lite").configure(
+                temperature=0.0, max_tokens=200
+            )
+    return model
+
+
+class _StreamCancel:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+
+def _run_query(messages: list[dict], runs: list, on_delta=None) -> tuple[str, any]:
+    # история передается целиком в каждом запросе, на стороне Yandex Cloud ничего не хранится
+    gpt = bootstrap()
+    if on_delta is None:
+        operation = gpt.run_deferred(messages)
+        runs.append(operation)
+        # по умолчанию SDK опрашивает статус раз в 10 с — это и было бы временем ответа
+        result = operation.wait(poll_interval=LLM_POLL_INTERVAL)
+        return result.alternatives[0].text, result.usage
+
+    cancel = _StreamCancel()
+    runs.append(cancel)
+    # частичный ответ обычно содержит весь текст с начала, наружу отдается только прирост
+    text, usage = "", None
+    for result in gpt.run_stream(messages):
+        if cancel.event.is_set():
+            break
+        partial = result.alternatives[0].text
+        if partial.startswith(text):
+            delta, text = partial[len(text):], partial
+        else:
+            delta, text = partial, text + partial
+        usage = result.usage
+        if delta:
+            on_delta(delta)
+    return text, usage
+
+
+def _parse_result(text: str) -> dict:
     try:
-        json_str = re.search(r"\{.*\}", result.message.parts[0], flags=re.DOTALL).group(0)
-        output = json.loads(json_str)
+        json_str = re.search(r"\{.*\}", text, flags=re.DOTALL).group(0)
+        return json.loads(json_str)
     except Exception as e:
-        output = {"error": "Я не могу ответить на ваш вопрос"}
-    return output, thread, result.usage
+        return {"error": "Я не могу ответить на ваш вопрос"}
+
+
+def _cancel_runs(runs: list):
+    for run in runs:
+        try:
+            run.cancel()
+        except Exception as e:
+            print(e)
+
+
+async def analyze_query(messages: list[dict]) -> tuple[dict, str, any]:
+    loop = asyncio.get_running_loop()
+    runs = []
+    async with semaphore:
+        try:
+            text, usage = await asyncio.wait_for(
+                loop.run_in_executor(executor, _run_query, messages, runs),
+                LLM_TIMEOUT,
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # поток пула нельзя прервать, но можно отменить операцию на стороне Yandex Cloud
+            loop.run_in_executor(None, _cancel_runs, runs)
+            raise
+
+    return _parse_result(text), text, usage
+
+
+async def stream_query(messages: list[dict]):
+    """То же, что analyze_query, но по ходу генерации отдает ("delta", текст),
+    а в конце — ("result", (output, text, usage))."""
+
+    loop = asyncio.get_running_loop()
+    runs = []
+    deltas = asyncio.Queue()
+
+    def on_delta(text: str):
+        loop.call_soon_threadsafe(deltas.put_nowait, text)
+
+    async with semaphore:
+        future = loop.run_in_executor(executor, _run_query, messages, runs, on_delta)
+        deadline = loop.time() + LLM_TIMEOUT
+        try:
+            while not (future.done() and deltas.empty()):
+                getter = asyncio.ensure_future(deltas.get())
+                done, _ = await asyncio.wait(
+                    {getter, future}, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    yield "delta", getter.result()
+                else:
+                    getter.cancel()
+                if not done:
+                    raise asyncio.TimeoutError()
+            text, usage = await future
+        except (asyncio.TimeoutError, asyncio.CancelledError, GeneratorExit):
+            loop.run_in_executor(None, _cancel_runs, runs)
+            raise
+
+    yield "result", (_parse_result(text), text, usage)